@@ -24,7 +24,15 @@ The git repository for my solutions for AoC 2024 challenges can be found here: h
 '''
 
 import argparse
+import array
+import collections
+import itertools
 import logging
+import math
+import operator
+import random
+import sys
+import time
 
 LOGLEVEL = logging.WARNING
 logging.basicConfig(level=LOGLEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -45,6 +53,24 @@ def load_file(fn: str):
     logging.debug(f"No of input lines: {len(lines)}")
     return lines
 
+def load_columns(fn: str):
+    '''
+    Function loads the given text file directly into two integer arrays, one for each column.
+    The file is read as bytes a block of lines at a time, so no per-line strings are kept around;
+    the arrays store the values as 64-bit integers (16 bytes per row for both columns).
+    @param fn:      path to the file to-be-loaded
+    @returns:       tuple of two array('q') objects, the left and the right column
+    '''
+    l1, l2 = array.array('q'), array.array('q')
+    with open(fn,'rb') as file:
+        for lines in iter(lambda: file.readlines(1 << 20), []):
+            # Each line has exactly two whitespace-separated entries, so the tokens alternate between the columns
+            tokens = b''.join(lines).split()
+            l1.extend(map(int, tokens[0::2]))
+            l2.extend(map(int, tokens[1::2]))
+    logging.debug(f"No of input rows: {len(l1)}")
+    return (l1,l2)
+
 # =========================
 
 def format_input_to_lists(input: list):
@@ -56,33 +82,304 @@ def format_input_to_lists(input: list):
         l2.append(int(entries[-1].strip()))
     return (l1,l2)
 
+def total_distance(l1, l2) -> int:
+    '''
+    Calculates the sum of distances between the two columns when both are paired in sorted order.
+    If the values are bounded to a range that is not much wider than the number of rows (the typical case with IDs),
+    the columns are not sorted but counted instead (a counting sort): the number of copies of each value is stored in an
+    array indexed by value - low, and the distinct values come out in order by scanning the array for non-zero counts.
+    The two histograms are then walked side by side. Each step pairs up as many copies of the current values as possible,
+    so the loop runs at most once per distinct value.
+    Otherwise, both columns are simply sorted and the differences summed.
+    '''
+    if len(l1) == 0 or len(l2) == 0:
+        return 0
+    low = min(min(l1), min(l2))
+    value_range = max(max(l1), max(l2)) - low + 1
+    if value_range > 2 * max(len(l1), len(l2)):
+        return sum(map(abs, map(operator.sub, sorted(l1), sorted(l2))))
+
+    counts1, counts2 = [0] * value_range, [0] * value_range
+    for column, counts in ((l1, counts1), (l2, counts2)):
+        # Counter does the counting in C; the counts are then placed at their values' indices
+        for value, count in collections.Counter(column).items():
+            counts[value - low] = count
+    keys1, keys2 = list(itertools.compress(range(value_range), counts1)), list(itertools.compress(range(value_range), counts2))
+    ans = 0
+    idx1, idx2 = 0, 0
+    left1, left2 = counts1[keys1[0]], counts2[keys2[0]]
+    while idx1 < len(keys1) and idx2 < len(keys2):
+        # Pair up the remaining copies of the current smallest values from both columns
+        paired = min(left1, left2)
+        ans += paired * abs(keys1[idx1] - keys2[idx2])
+        left1 -= paired
+        left2 -= paired
+        # Move on to the next distinct value in whichever column ran out
+        if left1 == 0:
+            idx1 += 1
+            left1 = counts1[keys1[idx1]] if idx1 < len(keys1) else 0
+        if left2 == 0:
+            idx2 += 1
+            left2 = counts2[keys2[idx2]] if idx2 < len(keys2) else 0
+    return ans
+
+def similarity_score(l1, l2) -> int:
+    '''Calculates the similarity score, i.e. the sum of each left value times its number of occurences in the right column.'''
+    # Count the occurences of each element in the second list once, so that the lookups below are constant time
+    counts = collections.Counter(l2)
+    return sum(element * counts[element] for element in l1)
+
+
+
+class LocationLists:
+    '''
+    Incrementally maintained pair of location lists. Supports inserting and deleting IDs in either column,
+    and reports the total distance (part 1) and the similarity score (part 2) without recomputing them from scratch.
+
+    The IDs are bounded to the range [0, max_id]. The total distance of two sorted lists equals the area between
+    their cumulative counts, i.e. the sum over x of |F1(x) - F2(x)|, where Fi(x) is the number of IDs <= x in column i.
+    The difference D(x) = F1(x) - F2(x) is kept in blocks of about sqrt(max_id) values. Each block holds a lazy offset,
+    a histogram of its stored values and the running sum of |D(x)| over the block, so adding +-1 to a whole block is constant time.
+    Inserting or deleting an ID adds +-1 to D(x) for every x >= ID, which costs O(sqrt(max_id)).
+    If the columns have different lengths, only the smallest IDs of the longer column are paired (as zip() does in part 1);
+    the cut-off ID is found from a Fenwick tree of counts, and the tail is handled with Fenwick trees of counts and sums.
+    The similarity score is updated in constant time from per-ID counts.
+    '''
+    def __init__(self, l1, l2, max_id=None) -> None:
+        if max_id is None:
+            # Default to the largest ID with the same number of digits as the largest ID in the input
+            max_id = 10 ** len(str(max(max(l1, default=0), max(l2, default=0)))) - 1
+        self.max_id     = max_id
+        self.size       = max_id + 1
+        self.block_size = max(1, math.isqrt(self.size))
+        self.lengths    = [0, 0]
+        self.counts     = [[0] * self.size, [0] * self.size]
+        # Fenwick trees (1-indexed) for the number and the sum of IDs in each column
+        self.count_tree = [[0] * (self.size + 1), [0] * (self.size + 1)]
+        self.sum_tree   = [[0] * (self.size + 1), [0] * (self.size + 1)]
+        self.similarity = 0
+
+        for column, values in enumerate((l1, l2)):
+            for value in values:
+                self._check_id(value)
+                self.counts[column][value] += 1
+            self.lengths[column] = len(values)
+        for value in range(self.size):
+            self.similarity += value * self.counts[0][value] * self.counts[1][value]
+        for column in (0, 1):
+            self._build_tree(self.count_tree[column], self.counts[column])
+            self._build_tree(self.sum_tree[column], [value * count for value, count in enumerate(self.counts[column])])
+
+        # Blocks of D(x): raw stored values, lazy offsets, histograms of the raw values, number of negative entries, sum of |D(x)| and block lengths
+        self.diffs      = []
+        self.offsets    = []
+        self.histograms = []
+        self.negatives  = []
+        self.abs_sums   = []
+        running = 0
+        for start in range(0, self.size, self.block_size):
+            block = []
+            for value in range(start, min(start + self.block_size, self.size)):
+                running += self.counts[0][value] - self.counts[1][value]
+                block.append(running)
+            self.diffs.append(block)
+            self.offsets.append(0)
+            self.histograms.append(collections.Counter(block))
+            self.negatives.append(sum(1 for diff in block if diff < 0))
+            self.abs_sums.append(sum(abs(diff) for diff in block))
+        self.block_lengths = [len(block) for block in self.diffs]
+
+    @classmethod
+    def from_input(cls, data: list, max_id=None):
+        '''Builds the structure from the lines of the input file.'''
+        l1, l2 = format_input_to_lists(data)
+        return cls(l1, l2, max_id)
+
+    def _check_id(self, value):
+        if not 0 <= value <= self.max_id:
+            raise ValueError(f"ID {value} is outside of the supported range [0, {self.max_id}]")
+
+    @staticmethod
+    def _build_tree(tree, values):
+        for idx, value in enumerate(values, start=1):
+            tree[idx] += value
+            parent = idx + (idx & -idx)
+            if parent < len(tree):
+                tree[parent] += tree[idx]
+
+    @staticmethod
+    def _tree_add(tree, idx, delta):
+        idx += 1
+        while idx < len(tree):
+            tree[idx] += delta
+            idx += idx & -idx
+
+    @staticmethod
+    def _tree_prefix(tree, idx):
+        '''Sum of the entries for IDs 0..idx (inclusive).'''
+        idx += 1
+        total = 0
+        while idx > 0:
+            total += tree[idx]
+            idx -= idx & -idx
+        return total
+
+    def _kth_smallest(self, column, k):
+        '''Finds the k-th smallest ID (1-based) in the given column by descending the Fenwick tree.'''
+        tree = self.count_tree[column]
+        pos = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step > 0:
+            if pos + step < len(tree) and tree[pos + step] < k:
+                pos += step
+                k -= tree[pos]
+            step >>= 1
+        return pos
+
+    def _shift_suffix(self, value, delta):
+        '''Adds delta (+1 or -1) to D(x) for every x >= value.'''
+        block_idx, entry_idx = divmod(value, self.block_size)
+        # Shift the entries from value to the end of its own block one by one
+        block = self.diffs[block_idx]
+        histogram = self.histograms[block_idx]
+        offset = self.offsets[block_idx]
+        abs_change, negative_change = 0, 0
+        for idx in range(entry_idx, len(block)):
+            old = block[idx]
+            new = old + delta
+            block[idx] = new
+            histogram[old] -= 1
+            histogram[new] += 1
+            abs_change += abs(new + offset) - abs(old + offset)
+            negative_change += (new + offset < 0) - (old + offset < 0)
+        self.abs_sums[block_idx] += abs_change
+        self.negatives[block_idx] += negative_change
+        # The following blocks are shifted as a whole. This is the hot loop, so the lists are bound to local names.
+        offsets, histograms, negatives, abs_sums = self.offsets, self.histograms, self.negatives, self.abs_sums
+        lengths = self.block_lengths
+        for idx in range(block_idx + 1, len(offsets)):
+            offset = offsets[idx]
+            if delta > 0:
+                # Every non-negative entry grows by one, every negative entry shrinks by one
+                abs_sums[idx] += lengths[idx] - 2 * negatives[idx]
+                negatives[idx] -= histograms[idx][-offset - 1]
+            else:
+                # Every positive entry shrinks by one, every non-positive entry grows by one
+                zeros = histograms[idx][-offset]
+                abs_sums[idx] += 2 * (negatives[idx] + zeros) - lengths[idx]
+                negatives[idx] += zeros
+            offsets[idx] = offset + delta
+
+    def _abs_prefix(self, value):
+        '''Sum of |D(x)| over x < value.'''
+        block_idx, entry_idx = divmod(value, self.block_size)
+        total = sum(self.abs_sums[:block_idx])
+        if block_idx < len(self.diffs):
+            offset = self.offsets[block_idx]
+            total += sum(abs(diff + offset) for diff in self.diffs[block_idx][:entry_idx])
+        return total
+
+    def _update(self, column, value, delta):
+        other = 1 - column
+        self.lengths[column] += delta
+        self.counts[column][value] += delta
+        self.similarity += delta * value * self.counts[other][value]
+        self._tree_add(self.count_tree[column], value, delta)
+        self._tree_add(self.sum_tree[column], value, delta * value)
+        self._shift_suffix(value, delta if column == 0 else -delta)
+
+    def insert(self, column: int, value: int):
+        '''Inserts an ID into the given column (0 for the left one, 1 for the right one).'''
+        self._check_id(value)
+        self._update(column, value, 1)
+
+    def delete(self, column: int, value: int):
+        '''Deletes one occurence of an ID from the given column (0 for the left one, 1 for the right one).'''
+        self._check_id(value)
+        if self.counts[column][value] == 0:
+            raise ValueError(f"ID {value} is not in column {column}")
+        self._update(column, value, -1)
+
+    def total_distance(self) -> int:
+        '''Returns the total distance between the columns, as in part 1.'''
+        paired = min(self.lengths)
+        if paired == 0:
+            return 0
+        if self.lengths[0] == self.lengths[1]:
+            return self._abs_prefix(self.size)
+        # Only the smallest IDs of the longer column are paired. Below the largest paired ID the areas are equal as before,
+        # and above it the difference is the remaining distance from the shorter column's IDs down to that cut-off.
+        longer = 0 if self.lengths[0] > self.lengths[1] else 1
+        shorter = 1 - longer
+        cutoff = self._kth_smallest(longer, paired)
+        above_count = self.lengths[shorter] - self._tree_prefix(self.count_tree[shorter], cutoff)
+        above_sum = self._tree_prefix(self.sum_tree[shorter], self.max_id) - self._tree_prefix(self.sum_tree[shorter], cutoff)
+        return self._abs_prefix(cutoff) + above_sum - above_count * cutoff
+
+    def similarity_score(self) -> int:
+        '''Returns the similarity score, as in part 2.'''
+        return self.similarity
+
+
+
+def replay_benchmark(data: list, nof_updates: int, seed=0):
+    '''
+    Benchmarks LocationLists on a stream of random updates: each update inserts a random ID into, or deletes a random ID from,
+    a random column, and both answers are read after every update. The timings are printed to stderr, together with
+    the time of one recomputation from scratch for comparison. Returns the final answers, which are checked against that recomputation.
+    '''
+    rng = random.Random(seed)
+    l1, l2 = format_input_to_lists(data)
+    build_start = time.perf_counter()
+    lists = LocationLists(l1, l2)
+    build_time = time.perf_counter() - build_start
+    print(f"LocationLists: built from {len(l1)}+{len(l2)} IDs in {build_time:.3f} s", file=sys.stderr)
+
+    replay_start = time.perf_counter()
+    for _ in range(nof_updates):
+        column = rng.randrange(2)
+        ids = l1 if column == 0 else l2
+        if ids and rng.random() < 0.5:
+            # The order of the IDs in a column does not matter, so the deleted one is moved to the end and popped from there
+            idx = rng.randrange(len(ids))
+            ids[idx], ids[-1] = ids[-1], ids[idx]
+            lists.delete(column, ids.pop())
+        else:
+            new_id = rng.randint(0, lists.max_id)
+            ids.append(new_id)
+            lists.insert(column, new_id)
+        # Read both answers after every update, as a user of the structure would
+        lists.total_distance(), lists.similarity_score()
+    replay_time = time.perf_counter() - replay_start
+    distance, similarity = lists.total_distance(), lists.similarity_score()
+
+    recompute_start = time.perf_counter()
+    expected = (total_distance(l1, l2), similarity_score(l1, l2))
+    recompute_time = time.perf_counter() - recompute_start
+
+    print(f"LocationLists: {nof_updates} updates in {replay_time:.3f} s, {1e6 * replay_time / max(nof_updates, 1):.1f} us each", file=sys.stderr)
+    print(f"Sorting both columns from scratch: {recompute_time:.3f} s", file=sys.stderr)
+    if (distance, similarity) != expected:
+        raise RuntimeError(f"Incremental answers {(distance, similarity)} differ from the recomputed ones {expected}")
+    return distance, similarity
+
 
 # =========================
 
 def part1(data: list) -> int:
     '''Solution for the part 1.'''
-    # Collect the two lists from the input file, and sort them
+    # Collect the two lists from the input file
     l1, l2 = format_input_to_lists(data)
-    l1.sort()
-    l2.sort()
-    
-    # Loop each pair of elements in the lists, and add their difference to the sum
-    ans = 0
-    for element1, element2 in zip(l1, l2):
-        ans += abs(element1-element2)
-    return ans
+    # Pair the elements in sorted order, and sum up their differences
+    return total_distance(l1, l2)
     
 
 def part2(data: list) -> int:
     '''Solution for the part 2.'''
     # Collect the two lists from the input file
     l1, l2 = format_input_to_lists(data)
-    
-    # Loop through each element in the first list, multiply it by the number of occurences in the second list, and add that product into the sum
-    ans = 0
-    for element in l1:
-        ans += element * l2.count(element)
-    return ans
+    # Multiply each element in the first list by its number of occurences in the second list, and sum up the products
+    return similarity_score(l1, l2)
 
 # =========================
 
@@ -90,11 +387,24 @@ if  __name__ == "__main__":
     # Fetch input text file path, either from the hard-coded variable FILENAME or from command line argument if given
     parser = argparse.ArgumentParser()
     parser.add_argument('input_fn', nargs='?', default=FILENAME, help="Path to the input text file. Optional; if not given, will default to the one hard-coded in the beginning of the script file.")
+    parser.add_argument('--fast', action='store_true', help="Load the columns straight into integer arrays instead of a list of lines. Uses much less memory on large inputs.")
+    parser.add_argument('--replay', type=int, metavar='N', help="Benchmark the incremental LocationLists structure by replaying N random insert/delete operations on the input.")
     args =  parser.parse_args()
 
-    # Load the data
-    data = load_file(args.input_fn)
+    if args.replay is not None:
+        # Replay random updates, and print the final solutions
+        distance, similarity = replay_benchmark(load_file(args.input_fn), args.replay)
+        print(f"Part 1 solution: {distance}")
+        print(f"Part 2 solution: {similarity}")
+    elif args.fast:
+        # Load the columns directly, and execute and print the solutions
+        l1, l2 = load_columns(args.input_fn)
+        print(f"Part 1 solution: {total_distance(l1, l2)}")
+        print(f"Part 2 solution: {similarity_score(l1, l2)}")
+    else:
+        # Load the data
+        data = load_file(args.input_fn)
 
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(data)}")
-    print(f"Part 2 solution: {part2(data)}")
+        # Execute and print the solutions
+        print(f"Part 1 solution: {part1(data)}")
+        print(f"Part 2 solution: {part2(data)}")
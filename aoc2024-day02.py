@@ -24,7 +24,12 @@ The git repository for my solutions for AoC 2024 challenges can be found here: h
 '''
 
 import argparse
+import array
+import concurrent.futures
+import itertools
 import logging
+import operator
+import os
 
 LOGLEVEL = logging.WARNING
 logging.basicConfig(level=LOGLEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -58,18 +63,140 @@ def is_safe(levels: list[int]):
     # Safe is each difference is between 1 and 3 (inclusive) for ascending sequence, or between -3 and -1 (inclusive) for descending sequence
     return all(3 >= diff >= 1 for diff in diffs) or all(-3 <= diff <= -1 for diff in diffs)
 
+def is_safe_with_removals(levels, max_removals: int) -> bool:
+    '''
+    Determines if the input list is safe according to the rules, if at most max_removals entries are removed.
+    For each direction, removals[i] is the least number of entries that need to be removed from levels[:i+1] so that
+    the remaining entries end with levels[i] and follow the rules. Only the last kept entry matters for what may follow,
+    so fewer removals is always at least as good, and the previous kept entry can be at most max_removals+1 steps back.
+    This makes the check O(n*k) per direction.
+    The cases k=0 and k=1 are the same as is_safe and is_safe_with_removal, which are used for them as they are faster.
+    '''
+    if max_removals == 0:
+        return is_safe(levels)
+    if max_removals == 1:
+        return is_safe_with_removal(levels)
+    nof_levels = len(levels)
+    if nof_levels <= max_removals + 1:
+        return True
+    for direction in (1, -1):
+        removals = []
+        for idx, level in enumerate(levels):
+            # Either remove everything before this entry, or continue from one of the previous kept entries
+            best = idx
+            for previous_idx in range(max(0, idx - max_removals - 1), idx):
+                if 1 <= (level - levels[previous_idx]) * direction <= 3:
+                    best = min(best, removals[previous_idx] + idx - previous_idx - 1)
+            removals.append(best)
+            # Remove everything after this entry
+            if best + nof_levels - idx - 1 <= max_removals:
+                return True
+    return False
+
+def _first_unsafe_pair(levels: list[int], direction: int, skipped_idx: int = -1) -> int:
+    '''
+    Finds the first adjacent pair which breaks the rules for the given direction (+1 for ascending, -1 for descending).
+    The entry at skipped_idx (if any) is treated as removed from the list.
+    Returns the index of the first entry of the offending pair, or -1 if there is none.
+    '''
+    previous_idx = -1
+    for idx, level in enumerate(levels):
+        if idx == skipped_idx:
+            continue
+        if previous_idx >= 0 and not 1 <= (level - levels[previous_idx]) * direction <= 3:
+            return previous_idx
+        previous_idx = idx
+    return -1
+
 def is_safe_with_removal(levels: list[int]):
     '''Determines if the input list is safe according to the rules, if at most one entry is removed'''
-    # Check if the line is safe even without any entries removed
-    if is_safe(levels):
-        return True
-    # Loop through each element in the line and check if the line is safe if that entry is removed
-    for removed_idx in range(len(levels)):
-        if is_safe(levels[:removed_idx] + levels[removed_idx+1:]):
+    for direction in (1, -1):
+        bad_idx = _first_unsafe_pair(levels, direction)
+        # Safe even without any entries removed
+        if bad_idx < 0:
+            return True
+        # Any fix has to remove one of the two entries of the first offending pair; otherwise they would stay adjacent.
+        # Check both candidates by skipping the entry, so that no copies of the list are needed.
+        if _first_unsafe_pair(levels, direction, bad_idx) < 0 or _first_unsafe_pair(levels, direction, bad_idx + 1) < 0:
             return True
     # If none of the previous apply, the line is not safe
     return False
 
+# =========================
+
+# Adjacent differences are clipped to the range [-4, 4] and shifted by 4, so that each one fits in a single byte.
+# A report is then safe if all of its difference codes are in one of these two sets.
+ASCENDING_CODES  = bytes([5, 6, 7])
+DESCENDING_CODES = bytes([1, 2, 3])
+
+def parse_reports(lines) -> tuple:
+    '''
+    Parses the reports once into a CSR layout: one flat array holding the levels of all reports back to back,
+    and an array of offsets, so that the levels of report i are levels[offsets[i]:offsets[i+1]].
+    @param lines:   iterable of lines (str or bytes), one report per line; empty lines are skipped
+    @returns:       tuple (levels, offsets) of array('q') objects
+    '''
+    levels, offsets = array.array('q'), array.array('q', [0])
+    for line in lines:
+        entries = line.split()
+        if len(entries) > 0:
+            levels.extend(map(int, entries))
+            offsets.append(len(levels))
+    return levels, offsets
+
+def count_safe_reports(levels, offsets) -> tuple:
+    '''
+    Counts the safe reports in a CSR store for both parts at once.
+    The differences of the whole flat array are computed and clipped in one go with C-level map() calls.
+    Each report then only checks its own slice of difference codes; the difference crossing into the next report is never part of a slice.
+    Reports that are not safe as is are checked again with is_safe_with_removal.
+    @returns:       tuple (number of safe reports, number of safe reports with at most one removal)
+    '''
+    diffs = map(operator.sub, itertools.islice(levels, 1, None), levels)
+    codes = bytes(map(min, itertools.repeat(8), map(max, itertools.repeat(0), map(operator.add, diffs, itertools.repeat(4)))))
+    safe, safe_with_removal = 0, 0
+    for start, end in zip(offsets, itertools.islice(offsets, 1, None)):
+        report_codes = codes[start:end-1]
+        # strip() removes every allowed code, so anything left over is a rule violation
+        if not report_codes.strip(ASCENDING_CODES) or not report_codes.strip(DESCENDING_CODES):
+            safe += 1
+            safe_with_removal += 1
+        elif is_safe_with_removal(levels[start:end]):
+            safe_with_removal += 1
+    return safe, safe_with_removal
+
+def _count_safe_reports_in_range(fn: str, start: int, end: int) -> tuple:
+    '''Worker for count_safe_reports_parallel: parses and counts the reports in the given byte range of the file.'''
+    with open(fn, 'rb') as file:
+        file.seek(start)
+        lines = file.read(end - start).splitlines()
+    return count_safe_reports(*parse_reports(lines))
+
+def count_safe_reports_parallel(fn: str, workers=None, chunk_size=1 << 24) -> tuple:
+    '''
+    Counts the safe reports of a (large) input file for both parts, processing it in chunks on a process pool.
+    The file is split into chunks of about chunk_size bytes, each ending at a line break, so that no report is split.
+    @param fn:          path to the input file
+    @param workers:     number of worker processes; defaults to the number of CPUs
+    @param chunk_size:  approximate size of one chunk in bytes
+    @returns:           tuple (number of safe reports, number of safe reports with at most one removal)
+    '''
+    file_size = os.path.getsize(fn)
+    bounds = [0]
+    with open(fn, 'rb') as file:
+        while bounds[-1] < file_size:
+            file.seek(min(bounds[-1] + chunk_size, file_size))
+            # Extend the chunk to the end of the line it ends on
+            file.readline()
+            bounds.append(min(file.tell(), file_size))
+    logging.debug(f"Split the input into {len(bounds)-1} chunks")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_count_safe_reports_in_range, itertools.repeat(fn), bounds[:-1], bounds[1:])
+        safe, safe_with_removal = 0, 0
+        for chunk_safe, chunk_safe_with_removal in results:
+            safe += chunk_safe
+            safe_with_removal += chunk_safe_with_removal
+    return safe, safe_with_removal
 
 # =========================
 
@@ -84,17 +211,35 @@ def part2(data: list) -> int:
     safe_lines = [line for line in data if is_safe_with_removal(line2levels(line))]
     return len(safe_lines)
 
+
+def count_safe_with_removals(levels, offsets, max_removals: int) -> int:
+    '''Counts the reports in a CSR store (as returned by parse_reports) which are safe if at most max_removals levels are removed.'''
+    return sum(1 for start, end in zip(offsets, itertools.islice(offsets, 1, None)) if is_safe_with_removals(levels[start:end], max_removals))
+
 # =========================
 
 if  __name__ == "__main__":
     # Fetch input text file path, either from the hard-coded variable FILENAME or from command line argument (if given)
     parser = argparse.ArgumentParser()
     parser.add_argument('input_fn', nargs='?', default=FILENAME, help="Path to the input text file. Optional; if not given, will default to the one hard-coded in the beginning of the script file.")
+    parser.add_argument('--workers', type=int, metavar='N', help="Parse and evaluate the input in chunks on N worker processes. Meant for very large inputs.")
+    parser.add_argument('--removals', type=int, metavar='K', help="Also count the reports that are safe if at most K levels are removed.")
     args =  parser.parse_args()
-
-    # Load the data
-    data = load_file(args.input_fn)
-
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(data)}")
-    print(f"Part 2 solution: {part2(data)}")
+    if args.workers is not None and args.removals is not None:
+        parser.error("--removals cannot be combined with --workers")
+
+    if args.workers is not None:
+        # Evaluate both parts in one go on a process pool
+        safe, safe_with_removal = count_safe_reports_parallel(args.input_fn, args.workers)
+        print(f"Part 1 solution: {safe}")
+        print(f"Part 2 solution: {safe_with_removal}")
+    else:
+        # Load the data, and parse it once into a CSR store
+        levels, offsets = parse_reports(load_file(args.input_fn))
+
+        # Evaluate both parts in one go, and print the solutions
+        safe, safe_with_removal = count_safe_reports(levels, offsets)
+        print(f"Part 1 solution: {safe}")
+        print(f"Part 2 solution: {safe_with_removal}")
+        if args.removals is not None:
+            print(f"Safe with at most {args.removals} removals: {count_safe_with_removals(levels, offsets, args.removals)}")
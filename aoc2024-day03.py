@@ -24,7 +24,11 @@ The git repository for my solutions for AoC 2024 challenges can be found here: h
 '''
 
 import argparse
+import concurrent.futures
+import functools
+import itertools
 import logging
+import os
 import re
 
 LOGLEVEL = logging.WARNING
@@ -47,24 +51,184 @@ def load_file(fn: str):
 
 # =========================
 
-def find_matches(s:str) -> list:
+# All valid instructions as per the assignment; a 'mul' instruction captures its two operands (integers with 1-3 digits)
+INSTRUCTION_PATTERN = re.compile(rb"mul\((\d{1,3}),(\d{1,3})\)|do\(\)|don't\(\)")
+# The same pattern for scanning strings
+INSTRUCTION_PATTERN_STR = re.compile(INSTRUCTION_PATTERN.pattern.decode())
+# Longest possible instruction, 'mul(XXX,YYY)'
+MAX_INSTRUCTION_LENGTH = 12
+
+def read_stripped_chunks(fn: str, chunk_size: int = 1 << 20, start: int = 0, end: int = None):
+    '''
+    Generator reads the given file in fixed-size byte chunks and yields pieces of data, which put together
+    equal the output of load_file (each line stripped, and the lines joined without separators).
+    Whitespace inside a line never belongs to an instruction, so a run of it is passed on as a single space.
+    @param fn:          path to the file to-be-loaded
+    @param chunk_size:  number of bytes read at a time
+    @param start:       byte offset to start reading from; should be at the beginning of a line
+    @param end:         byte offset to stop reading at, or None to read until the end of the file
+    '''
+    at_line_start = True
+    pending_space = False
+    with open(fn, 'rb') as file:
+        file.seek(start)
+        remaining = end - start if end is not None else -1
+        while remaining != 0 and (chunk := file.read(chunk_size if remaining < 0 else min(chunk_size, remaining))):
+            if remaining > 0:
+                remaining -= len(chunk)
+            # A lone carriage return ends a line as well, like in text mode; the extra empty lines are skipped anyway
+            for part_idx, part in enumerate(chunk.replace(b"\r", b"\n").split(b"\n")):
+                if part_idx > 0:
+                    # A line ended, so the trailing whitespace of the line is dropped
+                    at_line_start = True
+                    pending_space = False
+                if at_line_start:
+                    part = part.lstrip()
+                if len(part) == 0:
+                    continue
+                at_line_start = False
+                stripped = part.rstrip()
+                if len(stripped) > 0:
+                    yield b" " + stripped if pending_space else stripped
+                # Whitespace at the end of the part is only kept if the line continues in the next chunk
+                pending_space = len(stripped) < len(part)
+
+class StreamScanner:
+    '''
+    State machine for scanning the corrupted memory piece by piece, keeping track of both parts at once.
+    Instructions are matched from the beginning of the buffered data; a complete instruction always ends with ')',
+    so matches are final. Only the last few bytes, which may hold the beginning of an instruction cut at the
+    piece boundary, are carried over to the next piece. This keeps the memory use constant.
+
+    The scanner does not need to know whether 'mul' is enabled at the start. Until the first 'do()' or 'don't()',
+    the products are only added to enabled_total (the sum if the data starts enabled), and disabled_start_total
+    (the sum if the data starts disabled) gets nothing. After that, both cases are in the same state.
+    '''
+    def __init__(self) -> None:
+        self.total                  = 0
+        self.enabled_total          = 0
+        self.disabled_start_total   = 0
+        self.state                  = None      # None until the first 'do()' or 'don't()'
+        self.carry                  = b""
+
+    def _scan(self, buffer, stop: int) -> int:
+        '''Handles the instructions starting before the index stop in the buffer (str or bytes-like). Returns the end of the last one.'''
+        pattern = INSTRUCTION_PATTERN_STR if isinstance(buffer, str) else INSTRUCTION_PATTERN
+        # The sums and the state are kept in local variables in the loop, as it runs once per instruction
+        total, enabled_total, disabled_start_total, state = self.total, self.enabled_total, self.disabled_start_total, self.state
+        last_end = 0
+        for match in pattern.finditer(buffer):
+            if match.start() >= stop:
+                break
+            first = match[1]
+            if first is not None:
+                product = int(first) * int(match[2])
+                total += product
+                if state is None:
+                    enabled_total += product
+                elif state:
+                    enabled_total += product
+                    disabled_start_total += product
+            else:
+                # Either 'do()' or 'don't()'
+                state = len(match[0]) == 4
+            last_end = match.end()
+        self.total, self.enabled_total, self.disabled_start_total, self.state = total, enabled_total, disabled_start_total, state
+        return last_end
+
+    def feed(self, piece: bytes) -> None:
+        '''Scans the next piece of data.'''
+        buffer = self.carry + piece
+        last_end = self._scan(buffer, len(buffer))
+        # Any instruction starting before the last MAX_INSTRUCTION_LENGTH-1 bytes would have been complete already
+        self.carry = buffer[max(last_end, len(buffer) - MAX_INSTRUCTION_LENGTH + 1):]
+
+    def finish(self, lookahead: bytes = b"") -> None:
+        '''
+        Ends the scan. If the data continues elsewhere (as in a chunk of a larger file), lookahead should hold
+        (at least) the first MAX_INSTRUCTION_LENGTH-1 bytes that follow, so that an instruction cut at the end is still handled.
+        Instructions starting in the lookahead are left for whoever scans that data.
+        '''
+        self._scan(self.carry + lookahead[:MAX_INSTRUCTION_LENGTH - 1], len(self.carry))
+        self.carry = b""
+
+    def summary(self) -> tuple:
+        '''Returns the summary (total, enabled_total, disabled_start_total, state) of the scanned data.'''
+        return self.total, self.enabled_total, self.disabled_start_total, self.state
+
+def merge_summaries(first: tuple, second: tuple) -> tuple:
     '''
-    Function finds and returns in a list all valid 'mul' commands from as per the assignment,
-    i.e. all substrings of format 'mul(X,Y)', where X and Y are integers with 1-3 digits.
+    Combines the summaries of two consecutive pieces of data into the summary of both of them.
+    The operation is associative, so the summaries of any number of chunks can be combined in order.
     '''
-    pattern = r"mul\(\d{1,3},\d{1,3}\)"
-    return re.findall(pattern, s)
+    total1, enabled1, disabled1, state1 = first
+    total2, enabled2, disabled2, state2 = second
+    # The second piece starts in the state the first one ends in; if the first one has no 'do()' or 'don't()', in the initial state
+    enabled = enabled1 + (enabled2 if state1 is None or state1 else disabled2)
+    disabled = disabled1 + (disabled2 if state1 is None or not state1 else enabled2)
+    return total1 + total2, enabled, disabled, state2 if state2 is not None else state1
 
-def mul(s: str) -> int:
+def evaluate(data) -> tuple:
     '''
-    Function executes a 'mul' command as per the assignment. Function takes as a parameter one valid 'mul' command,
-    i.e. a string with format 'mul(X,Y)', where X and Y are integers with 1-3 digits.
-    Function returns the product of the command, that is, X*Y.
+    Solves both parts in a single pass over the data, without any intermediate lists of matches.
+    @param data:    the corrupted memory, as a string (as returned by load_file) or a bytes-like object such as bytes or mmap
+    @returns:       tuple (part 1 solution, part 2 solution)
     '''
-    pattern = r"\d{1,3}"
-    values = re.findall(pattern, s)
-    return int(values[0]) * int(values[1])
+    scanner = StreamScanner()
+    # The whole data is available, so it can be scanned in place without copying it into the carry buffer
+    scanner._scan(data, len(data))
+    return scanner.total, scanner.enabled_total
 
+def scan_file(fn: str, chunk_size: int = 1 << 20) -> tuple:
+    '''
+    Scans the given file in constant memory, and returns the solutions for both parts.
+    @param fn:          path to the input file
+    @param chunk_size:  number of bytes read at a time
+    @returns:           tuple (part 1 solution, part 2 solution)
+    '''
+    scanner = StreamScanner()
+    for piece in read_stripped_chunks(fn, chunk_size):
+        scanner.feed(piece)
+    scanner.finish()
+    return scanner.total, scanner.enabled_total
+
+def _scan_file_range(fn: str, start: int, end: int) -> tuple:
+    '''Worker for scan_file_parallel: scans the lines in the given byte range of the file and returns their summary.'''
+    scanner = StreamScanner()
+    for piece in read_stripped_chunks(fn, start=start, end=end):
+        scanner.feed(piece)
+    # Lines are joined without separators, so an instruction may continue on the lines after the range
+    lookahead = b""
+    for piece in read_stripped_chunks(fn, MAX_INSTRUCTION_LENGTH, start=end):
+        lookahead += piece
+        if len(lookahead) >= MAX_INSTRUCTION_LENGTH - 1:
+            break
+    scanner.finish(lookahead)
+    return scanner.summary()
+
+def scan_file_parallel(fn: str, workers=None, chunk_size=1 << 24) -> tuple:
+    '''
+    Scans the given file on a process pool, and returns the solutions for both parts.
+    The file is split into chunks of about chunk_size bytes at line breaks. Each chunk is scanned separately into a summary
+    holding its sums both for starting enabled and disabled, and the summaries are combined in order with merge_summaries.
+    @param fn:          path to the input file
+    @param workers:     number of worker processes; defaults to the number of CPUs
+    @param chunk_size:  approximate size of one chunk in bytes
+    @returns:           tuple (part 1 solution, part 2 solution)
+    '''
+    file_size = os.path.getsize(fn)
+    bounds = [0]
+    with open(fn, 'rb') as file:
+        while bounds[-1] < file_size:
+            file.seek(min(bounds[-1] + chunk_size, file_size))
+            # Extend the chunk to the end of the line it ends on
+            file.readline()
+            bounds.append(min(file.tell(), file_size))
+    logging.debug(f"Split the input into {len(bounds)-1} chunks")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        summaries = executor.map(_scan_file_range, itertools.repeat(fn), bounds[:-1], bounds[1:])
+        total, enabled_total, _, _ = functools.reduce(merge_summaries, summaries, (0, 0, 0, None))
+    return total, enabled_total
 
 # =========================
         
@@ -72,28 +236,16 @@ def part1(data: str) -> int:
     '''
     Solution for the part 1.
     '''
-    # Find all valid 'mul' commands from the data, and execute the command on each of them
-    mults = [mul(cmd) for cmd in find_matches(data)]
-    # Calculate and return the sum of the products
-    return sum(mults)
+    # Sum up the products of all valid 'mul' commands
+    return evaluate(data)[0]
 
 
 def part2(data: str) -> int:
     '''
     Solution for the part 2.
     '''
-    # Parse the data:
-    # 1. Split the data with 'don't()'.
-    # 2. Split each of these substrings with the first 'do()'. 
-    # 3. The valid segments are everything after the first do() in every segments, i.e. the second element in the segments splitted by 'do()' in step 2.
-    #    (If there are multiple do()'s in the segment, the rest apart the first don't do anything.)
-    applicable_data = [segment.split("do()",1)[1] for segment in data.split("don't()") if "do()" in segment]
-    # Add the very first segment (the segment before any 'don't()'s)
-    applicable_data = [data.split("don't()")[0]] + applicable_data
-    applicable_data = ''.join(applicable_data)
-    # Calculate the products and their sum as in part 1
-    mults = [mul(cmd) for cmd in find_matches(applicable_data)]
-    return sum(mults)
+    # Sum up the products of the 'mul' commands, which are enabled by the latest 'do()' or 'don't()' before them
+    return evaluate(data)[1]
 
 # =========================
 
@@ -101,11 +253,25 @@ if  __name__ == "__main__":
     # Fetch input text file path, either from the hard-coded variable FILENAME or from command line argument (if given)
     parser = argparse.ArgumentParser()
     parser.add_argument('input_fn', nargs='?', default=FILENAME, help="Path to the input text file. Optional; if not given, will default to the one hard-coded in the beginning of the script file.")
+    parser.add_argument('--stream', action='store_true', help="Scan the input file in fixed-size chunks instead of loading it into memory.")
+    parser.add_argument('--workers', type=int, metavar='N', help="Scan the input file in chunks on N worker processes. Meant for very large inputs.")
     args =  parser.parse_args()
 
-    # Load the data
-    data = load_file(args.input_fn)
+    if args.workers is not None:
+        # Scan the file on a process pool, and print the solutions
+        total, enabled_total = scan_file_parallel(args.input_fn, args.workers)
+        print(f"Part 1 solution: {total}")
+        print(f"Part 2 solution: {enabled_total}")
+    elif args.stream:
+        # Scan the file once for both parts, and print the solutions
+        total, enabled_total = scan_file(args.input_fn)
+        print(f"Part 1 solution: {total}")
+        print(f"Part 2 solution: {enabled_total}")
+    else:
+        # Load the data
+        data = load_file(args.input_fn)
 
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(data)}")
-    print(f"Part 2 solution: {part2(data)}")
+        # Execute both parts in a single pass, and print the solutions
+        total, enabled_total = evaluate(data)
+        print(f"Part 1 solution: {total}")
+        print(f"Part 2 solution: {enabled_total}")
@@ -24,9 +24,10 @@ The git repository for my solutions for AoC 2024 challenges can be found here: h
 '''
 
 import argparse
+import collections
+import functools
 import itertools
 import logging
-import re
 
 LOGLEVEL = logging.WARNING
 logging.basicConfig(level=LOGLEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -49,10 +50,6 @@ def load_file(fn: str):
 
 # =========================
 
-def nof_xmas(line:str) -> int:
-    '''Returns the number of 'XMAS' written on the line, normally or backwards.'''
-    return len(re.findall("XMAS",line)) + len(re.findall("SAMX",line))
-
 def get_columns(data: list[str]) -> list[str]:
     '''Returns columns from the matrix.'''
     return [''.join(list(x)) for x in zip(*data)]
@@ -63,7 +60,7 @@ def get_diagonals(data: list[str]) -> list[str]:
         '''Returns all 'downwards' diagonals, i.e. diagonals travelling from top left to bottom right (or parallel to it).'''
         diags = []
         # Determine each diagonal starting from the first row, travelling to down and right
-        for start_col_idx in range(len(data[1])):
+        for start_col_idx in range(len(data[0])):
             diags.append(''.join( [ data[row_idx][col_idx] for  row_idx, col_idx in zip(range(len(data)), range(start_col_idx, len(data[0])))] ) )
         # Determine each diagonal starting from the first column, travelling to down and right, except the first row (which was taken in the last step)
         for start_row_idx in range(1,len(data)):
@@ -73,51 +70,204 @@ def get_diagonals(data: list[str]) -> list[str]:
     return _get_downwards_diagonals(data) + _get_downwards_diagonals(data_flipped)
 
 
+class AhoCorasick:
+    '''
+    Aho-Corasick automaton for counting the occurences of many patterns in one pass over a text.
+    The transitions are precomputed for every state and every letter used in the patterns,
+    so scanning takes one dictionary lookup per character; other characters lead back to the root.
+    '''
+    def __init__(self, patterns: list[str]) -> None:
+        self.patterns = list(patterns)
+        self.transitions = [{}]
+        self.terminal_states = []
+        # Build the trie of the patterns
+        for pattern in self.patterns:
+            state = 0
+            for letter in pattern:
+                if letter not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.transitions[state][letter] = len(self.transitions) - 1
+                state = self.transitions[state][letter]
+            self.terminal_states.append(state)
+        # Compute the failure links in breadth-first order, and fill in the missing transitions from them
+        alphabet = set(itertools.chain.from_iterable(self.patterns))
+        self.failure = [0] * len(self.transitions)
+        self.order = []
+        queue = collections.deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            self.order.append(state)
+            for letter, next_state in self.transitions[state].items():
+                self.failure[next_state] = self.transitions[self.failure[state]].get(letter, 0) if state != 0 else 0
+                queue.append(next_state)
+            for letter in alphabet:
+                if letter not in self.transitions[state]:
+                    self.transitions[state][letter] = self.transitions[self.failure[state]].get(letter, 0)
+        for letter in alphabet:
+            self.transitions[0].setdefault(letter, 0)
+
+    def count(self, text: str) -> list[int]:
+        '''
+        Counts the occurences of each pattern in the text (overlapping occurences included).
+        Only the number of visits to each state is recorded while scanning. A visit to a state is also an occurence
+        of every pattern ending at its failure-link ancestors, so the visits are pushed down the failure links afterwards.
+        '''
+        transitions = self.transitions
+        visits = [0] * len(transitions)
+        state = 0
+        for letter in text:
+            state = transitions[state].get(letter, 0)
+            visits[state] += 1
+        for state in reversed(self.order):
+            visits[self.failure[state]] += visits[state]
+        return [visits[state] for state in self.terminal_states]
+
+def count_words(data: list[str], words: list[str]) -> dict:
+    '''
+    Counts the occurences of each word in the grid in all eight directions (so a palindrome is counted twice per occurence, as in part 1).
+    The rows, columns and diagonals are joined into one text with line breaks in between, and the words and their reversals
+    are searched for in a single pass with an Aho-Corasick automaton.
+    @param data:        the grid, one string per row
+    @param words:       the words to search for
+    @returns:           dict word -> number of occurences
+    '''
+    patterns = sorted(set(words) | set(word[::-1] for word in words))
+    text = '\n'.join(itertools.chain(data, get_columns(data), get_diagonals(data)))
+    occurences = dict(zip(patterns, AhoCorasick(patterns).count(text)))
+    return {word: occurences[word] + occurences[word[::-1]] for word in words}
+
 # =========================
 
-def part1(data: list) -> int:
+# Directions (row step, column step) for the word search; the four others are covered by searching for the reversed word
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+@functools.cache
+def _letter_table(letter: str) -> bytes:
+    '''Translation table mapping the letter to '1' and everything else to '0', so that a row can be parsed as a binary number.'''
+    return bytes(ord('1') if byte == ord(letter) else ord('0') for byte in range(256))
+
+def letter_masks(data: list[str], letters: str) -> dict:
     '''
-    Solution for the part 1.
+    Converts the grid into bitmasks: for each letter, one integer per row with a set bit for each column holding that letter.
+    The first column is the most significant bit, so the cell at column c+dc lines up with column c when shifted left by dc.
+    The masks of shifted rows can then be combined with bitwise operations, handling whole rows at a time.
+    @param data:        the grid, one string per row
+    @param letters:     the letters to build the masks for
+    @returns:           dict letter -> list of row masks
     '''
-    ans = 0
-    
-    # Check rows
-    for row in data:
-        ans += nof_xmas(row)
+    masks = {}
+    for letter in set(letters):
+        table = _letter_table(letter)
+        masks[letter] = [int(row.encode().translate(table), 2) if len(row) > 0 else 0 for row in data]
+    return masks
 
-    # Check columns
-    for col in get_columns(data):
-        ans += nof_xmas(col)
+def _aligned(mask: int, col_offset: int) -> int:
+    '''Shifts a row mask so that the cell at column c+col_offset lines up with column c.'''
+    return mask << col_offset if col_offset >= 0 else mask >> -col_offset
 
-    # Check diagonals
-    for diag in get_diagonals(data):
-        ans += nof_xmas(diag)
+def _word_starts(masks: dict, word: str, row_idx: int, row_step: int, col_step: int) -> int:
+    '''
+    Returns the mask of the columns on the given row where the word starts in the given direction.
+    The masks of the rows the word passes through are shifted in line and ANDed together. The rows must exist in masks.
+    '''
+    found = masks[word[0]][row_idx]
+    for letter_idx in range(1, len(word)):
+        if found == 0:
+            break
+        found &= _aligned(masks[word[letter_idx]][row_idx + letter_idx * row_step], letter_idx * col_step)
+    return found
 
+def _x_mas_centers(masks: dict, row_idx: int) -> int:
+    '''Returns the mask of the 'A's on the given row with 'M' and 'S' at the opposite ends of both diagonals. The rows above and below must exist in masks.'''
+    m, s = masks['M'], masks['S']
+    above, below = row_idx - 1, row_idx + 1
+    # Top left to down right
+    diagonal = (_aligned(m[above], -1) & _aligned(s[below], 1)) | (_aligned(s[above], -1) & _aligned(m[below], 1))
+    # Down left to top right
+    antidiagonal = (_aligned(m[below], -1) & _aligned(s[above], 1)) | (_aligned(s[below], -1) & _aligned(m[above], 1))
+    return masks['A'][row_idx] & diagonal & antidiagonal
+
+def count_word(masks: dict, word: str, directions=DIRECTIONS) -> int:
+    '''
+    Counts the occurences of the word in the grid in the given directions, both forwards and backwards.
+    For each starting row, the set bits of _word_starts are exactly the starting columns of a match.
+    @param masks:       letter masks of the grid, see letter_masks
+    @param word:        the word to search for
+    @returns:           number of occurences
+    '''
+    nof_rows = len(next(iter(masks.values())))
+    ans = 0
+    for candidate in (word, word[::-1]):
+        for row_step, col_step in directions:
+            last_row_offset = (len(candidate) - 1) * row_step
+            for row_idx in range(max(0, -last_row_offset), min(nof_rows, nof_rows - last_row_offset)):
+                ans += _word_starts(masks, candidate, row_idx, row_step, col_step).bit_count()
     return ans
 
+def count_x_mas(masks: dict) -> int:
+    '''
+    Counts the X-MAS patterns in the grid, i.e. the 'A's with 'M' and 'S' at the opposite ends of both diagonals.
+    Works row by row on the bitmasks, like count_word.
+    '''
+    nof_rows = len(masks['A'])
+    return sum(_x_mas_centers(masks, row_idx).bit_count() for row_idx in range(1, nof_rows - 1))
+
+class StreamingWordSearch:
+    '''
+    Counts the occurences of a word (as in part 1) and the X-MAS patterns (as in part 2) while the rows of the grid arrive one at a time.
+    Only the letter masks of the last few rows are kept: enough for the word to span them vertically, and at least three for X-MAS.
+    Each new row completes the words that end on it, i.e. the vertical and diagonal words starting len(word)-1 rows above it,
+    and the X-MAS patterns centered on the previous row. The memory use is O(width * word length), regardless of the number of rows.
+    '''
+    def __init__(self, word: str = "XMAS") -> None:
+        self.word           = word
+        self.window_size    = max(len(word), 3)
+        self.masks          = {letter: collections.deque(maxlen=self.window_size) for letter in set(word) | set("MAS")}
+        self.word_count     = 0
+        self.x_mas_count    = 0
+
+    def add_row(self, row: str) -> None:
+        '''Adds the next row of the grid, and counts the occurences it completes.'''
+        for letter, window in self.masks.items():
+            window.append(letter_masks([row], letter)[letter][0])
+        nof_rows = len(self.masks['A'])
+        for candidate in (self.word, self.word[::-1]):
+            for row_step, col_step in DIRECTIONS:
+                start_idx = nof_rows - 1 - (len(candidate) - 1) * row_step
+                if start_idx >= 0:
+                    self.word_count += _word_starts(self.masks, candidate, start_idx, row_step, col_step).bit_count()
+        if nof_rows >= 3:
+            self.x_mas_count += _x_mas_centers(self.masks, nof_rows - 2).bit_count()
+
+def stream_file(fn: str, word: str = "XMAS") -> tuple:
+    '''
+    Reads the grid from the given file one row at a time, and returns the solutions for both parts.
+    @param fn:      path to the input file
+    @param word:    the word to search for in part 1
+    @returns:       tuple (part 1 solution, part 2 solution)
+    '''
+    search = StreamingWordSearch(word)
+    with open(fn, 'r') as file:
+        for line in file:
+            if len(line.strip()) > 0:
+                search.add_row(line.strip())
+    return search.word_count, search.x_mas_count
+
+# =========================
+
+def part1(data: list) -> int:
+    '''
+    Solution for the part 1.
+    '''
+    # Search rows, columns and both diagonals, forwards and backwards
+    return count_word(letter_masks(data, "XMAS"), "XMAS")
+
 
 def part2(data: list) -> int:
     '''
     Solution for the part 2.
     '''
-    def _has_x_mas(data,row_idx, col_idx):
-        '''Checks if the character specified by the row_idx and col_idx is the center of a x-mas'''
-        if not data[row_idx][col_idx] == 'A':
-            return False
-        # Top left to down right
-        if not (data[row_idx-1][col_idx-1] == 'M' and data[row_idx+1][col_idx+1] == 'S') and not (data[row_idx-1][col_idx-1] == 'S' and data[row_idx+1][col_idx+1] == 'M'):
-            return False
-        # Down left to top right
-        if not (data[row_idx+1][col_idx-1] == 'M' and data[row_idx-1][col_idx+1] == 'S') and not (data[row_idx+1][col_idx-1] == 'S' and data[row_idx-1][col_idx+1] == 'M'):
-            return False
-        return True
-    
-    ans = 0
-    # Iterate over all characters in the grid, except for the edge rows and columns (as they canmnot contain the center character of a x-mas)
-    for row_idx, col_idx in itertools.product(range(1,len(data)-1), range(1,len(data[0])-1)):
-        if _has_x_mas(data, row_idx, col_idx):
-            ans += 1
-    return ans
+    return count_x_mas(letter_masks(data, "MAS"))
 
 # =========================
 
@@ -125,11 +275,23 @@ if  __name__ == "__main__":
     # Fetch input text file path, either from the hard-coded variable FILENAME or from command line argument (if given)
     parser = argparse.ArgumentParser()
     parser.add_argument('input_fn', nargs='?', default=FILENAME, help="Path to the input text file. Optional; if not given, will default to the one hard-coded in the beginning of the script file.")
+    parser.add_argument('--words', metavar='WORDS_FN', help="Path to a text file with one word per line. If given, also counts each of the words in the grid in all directions.")
+    parser.add_argument('--stream', action='store_true', help="Read the grid one row at a time, keeping only the last few rows in memory.")
     args =  parser.parse_args()
 
-    # Load the data
-    data = load_file(args.input_fn)
+    if args.stream:
+        # Stream the grid through, and print the solutions
+        word_count, x_mas_count = stream_file(args.input_fn)
+        print(f"Part 1 solution: {word_count}")
+        print(f"Part 2 solution: {x_mas_count}")
+    else:
+        # Load the data, and convert it into letter masks once for both parts
+        data = load_file(args.input_fn)
+        masks = letter_masks(data, "XMAS")
 
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(data)}")
-    print(f"Part 2 solution: {part2(data)}")
+        # Execute and print the solutions
+        print(f"Part 1 solution: {count_word(masks, 'XMAS')}")
+        print(f"Part 2 solution: {count_x_mas(masks)}")
+        if args.words is not None:
+            for word, count in count_words(data, load_file(args.words)).items():
+                print(f"{word}: {count}")
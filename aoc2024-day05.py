@@ -25,10 +25,13 @@ The git repository for my solutions for AoC 2024 challenges can be found here: h
 
 import argparse
 import collections
-import itertools
+import functools
 import logging
 import math
 import random
+import sys
+import time
+import typing
 
 LOGLEVEL = logging.WARNING
 logging.basicConfig(level=LOGLEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -51,26 +54,56 @@ def load_file(fn: str):
 
 # =========================
 
-class Rule:
-    '''Data class represents one rule.'''
-    def __init__(self, first, second) -> None:
-        self.first  = first
-        self.second = second
+class Rule(typing.NamedTuple):
+    '''Data class represents one rule. As a tuple, rules are compact and can be stored in sets.'''
+    first:  int
+    second: int
     def __repr__(self):
         return f"{self.first}|{self.second}"
 
 
+class RuleIndex:
+    '''
+    Index of all rules, built once. Holds the set of the rules for constant-time lookups of page pairs,
+    and for each page the sets of pages which must come after it (its successors) and before it (its predecessors).
+    Iterating over the index yields the rules.
+    '''
+    __slots__ = ('rules', 'successors', 'predecessors')
+
+    def __init__(self, rules) -> None:
+        self.rules = frozenset(rules)
+        successors, predecessors = collections.defaultdict(set), collections.defaultdict(set)
+        for rule in self.rules:
+            successors[rule.first].add(rule.second)
+            predecessors[rule.second].add(rule.first)
+        self.successors = {page: frozenset(pages) for page, pages in successors.items()}
+        self.predecessors = {page: frozenset(pages) for page, pages in predecessors.items()}
+
+    def __contains__(self, rule) -> bool:
+        return rule in self.rules
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __repr__(self):
+        return f"RuleIndex({len(self.rules)} rules)"
+
+
 def parse_input(data):
-    '''Parses the input data into rules and sets of pages.'''
+    '''Parses the input data into an index of the rules and sets of pages.'''
     rules_data, pages_data = data.split("\n\n")
     rules_data = [rule.strip() for rule in rules_data.split("\n") if len(rule.strip()) > 0]
     pages_data = [page.strip() for page in pages_data.split("\n") if len(page.strip()) > 0]
 
-    # Parse the rules
+    # Parse the rules, and index them
     rules = []
     for rule in rules_data:
         first, second = rule.split("|")
         rules.append(Rule(int(first), int(second)))
+    rules = RuleIndex(rules)
     
     # Parse the sets of pages
     pages_list = []
@@ -80,56 +113,225 @@ def parse_input(data):
     return rules, pages_list
 
 
-def check_rule(rule: Rule, pages: list):
-    '''Checks the given rule against the given list of pages.'''
-    second_page_reached = False
+def check_pages_against_all_rules(pages: list[int], rules: RuleIndex):
+    '''
+    Function checks the set of pages against all rules and returns if pages satisfied all rules.
+    A rule is broken exactly when a page comes after one of its successors, so one pass over the pages suffices,
+    regardless of the total number of rules.
+    '''
+    seen_pages = set()
     for page in pages:
-        if page == rule.first and second_page_reached:
+        if not rules.successors.get(page, frozenset()).isdisjoint(seen_pages):
             return False
-        if page == rule.second:
-            second_page_reached = True
+        seen_pages.add(page)
     return True
 
 
-def check_pages_against_all_rules(pages: list[int], rules: list[Rule]):
-    '''Function checks the set of pages against all rules and returns if pages satisfied all rules.'''
-    rules_satisfied = [check_rule(rule,pages) for rule in rules]
-    return all(rules_satisfied)
-
-
-def reorder_pages(pages: list[int], rules: list[Rule]):
-    '''Reorders the given pages such that the order satisfy all rules.'''
-    def unordered_pages(all_pages, ordered_pages):
-        return [page for page in all_pages if page not in ordered_pages]
-    # Relevant rules => rules whose both pages exist in the list of pages
-    relevant_rules = [rule for rule in rules if rule.first in pages and rule.second in pages]
-
-    # The list where the pages are collected in the correct order
-    ordered_pages = [pages[0]]
-
-    # Algorithm description:
-    # 1. Get the next page that is not yet in the ordered list.
-    # 2. Go through the ordered list from the beginning. If there is a rule that specifies an order of (new_page|ordered_page), place the new page immediately before the already ordered page.
-    # 3. Get the next page that is not yet in the ordered list.
-    # 4. Go through the ordered list from the end. If there is a rule that specifies an order of (ordered_page|new_page), place the new page immediately after the already ordered page.
-    # 5. Loop steps 1-4, until all pages have been ordered.
-    # The algorithm assumes that there is only one correct order, implicating that there exists always at least one unordered page and one rule, which together determine the position of the
-    # new page relative to the already placed pages.
-    while len(ordered_pages) < len(pages):
-        for new_page, (idx, ordered_page), rule in itertools.product(unordered_pages(pages, ordered_pages), enumerate(ordered_pages), relevant_rules):
-            if rule.first == new_page and rule.second == ordered_page:
-                ordered_pages.insert(idx, new_page)
-                break
-        for new_page, idx, rule in itertools.product(unordered_pages(pages, ordered_pages), range(len(ordered_pages)-1,-1,-1), relevant_rules):
-            ordered_page = ordered_pages[idx]
-            if rule.second == new_page and rule.first == ordered_page:
-                ordered_pages.insert(idx+1, new_page)
-                break
+def _compare_pages(rules: RuleIndex):
+    '''Returns a comparison function for sorting pages, backed by lookups in the set of rules.'''
+    def _compare(first, second):
+        if Rule(first, second) in rules:
+            return -1
+        if Rule(second, first) in rules:
+            return 1
+        return 0
+    return _compare
+
+
+def _is_chained(ordered_pages: list[int], rules: RuleIndex) -> bool:
+    '''
+    Checks if there is a rule for each pair of adjacent pages in the order. Then the order is the only one satisfying the rules
+    (assuming they contain no cycles): any rule breaking it would form a cycle with the chain of rules.
+    '''
+    return all(Rule(first, second) in rules for first, second in zip(ordered_pages, ordered_pages[1:]))
+
+
+def _topological_order(pages: list[int], rules: RuleIndex, stop: int = None) -> list[int]:
+    '''
+    Orders the pages with Kahn's algorithm on the rules restricted to the pages: a page is placed once all of its predecessors
+    have been placed. If the order is not unique, the pages become ready in the order they are listed.
+    @param stop:    if given, stop after this many pages have been placed
+    '''
+    page_set = set(pages)
+    # Number of predecessors of each page, which have not been placed yet
+    remaining = {page: len(rules.predecessors.get(page, frozenset()) & page_set) for page in pages}
+    ready = collections.deque(page for page in pages if remaining[page] == 0)
+    ordered_pages = []
+    while ready and (stop is None or len(ordered_pages) < stop):
+        page = ready.popleft()
+        ordered_pages.append(page)
+        for next_page in rules.successors.get(page, frozenset()) & page_set:
+            remaining[next_page] -= 1
+            if remaining[next_page] == 0:
+                ready.append(next_page)
+    if len(ordered_pages) < (len(pages) if stop is None else min(stop, len(pages))):
+        raise ValueError(f"The rules for pages {pages} contain a cycle")
     return ordered_pages
 
+
+def reorder_pages(pages: list[int], rules: RuleIndex):
+    '''
+    Reorders the given pages such that the order satisfy all rules.
+    The pages are first sorted with a comparison backed by the rule lookups, which is O(k log k) lookups. This gives the order
+    whenever it is unique (as in the puzzle inputs), which is confirmed from the rules between adjacent pages.
+    Otherwise, the pages are sorted topologically.
+    '''
+    ordered_pages = sorted(pages, key=functools.cmp_to_key(_compare_pages(rules)))
+    if _is_chained(ordered_pages, rules):
+        return ordered_pages
+    return _topological_order(pages, rules)
+
+
+def middle_page(pages: list[int], rules: RuleIndex) -> int:
+    '''
+    Returns the middle page of the pages once reordered to satisfy all rules, without ordering all of them.
+    The middle page is selected with quickselect, using the same comparison as reorder_pages (O(k) lookups on average).
+    The selected page is certainly in the middle if the rules place it after exactly half of the other pages and before the rest.
+    Otherwise, the topological sort is run until it reaches the middle.
+    '''
+    middle_idx = int((len(pages)-1)/2)
+    compare = _compare_pages(rules)
+    candidates, idx = list(pages), middle_idx
+    while True:
+        pivot = candidates[len(candidates) // 2]
+        before = [page for page in candidates if compare(page, pivot) < 0]
+        after = [page for page in candidates if compare(page, pivot) > 0]
+        if idx < len(before):
+            candidates = before
+        elif idx >= len(candidates) - len(after):
+            idx -= len(candidates) - len(after)
+            candidates = after
+        else:
+            break
+    page_set = set(pages)
+    if len(rules.predecessors.get(pivot, frozenset()) & page_set) == middle_idx and \
+       len(rules.successors.get(pivot, frozenset()) & page_set) == len(pages) - middle_idx - 1:
+        return pivot
+    return _topological_order(pages, rules, stop=middle_idx + 1)[middle_idx]
+
+class ReorderCache:
+    '''
+    Bounded LRU cache of reordered updates, keyed by the frozenset of the pages. When there is a rule between each pair of
+    adjacent pages in the order, the order is the only one satisfying the rules, so it is the same for any update with the
+    same set of pages. Only such orders are cached; if the rules leave the order open, reorder_pages keeps the pages in the
+    order they are listed, which depends on the update, so those updates are reordered without the cache.
+    Updates listing a page more than once are not cached either, as the set would lose the duplicates.
+    The hits, misses and evictions are counted, to help choosing the size of the cache.
+    '''
+    def __init__(self, rules: RuleIndex, maxsize: int = 1024) -> None:
+        self.rules      = rules
+        self.maxsize    = maxsize
+        self.orders     = collections.OrderedDict()
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+
+    def reorder_pages(self, pages: list[int]) -> list[int]:
+        '''Returns the pages reordered to satisfy all rules, see reorder_pages.'''
+        key = frozenset(pages)
+        if len(key) < len(pages):
+            return reorder_pages(pages, self.rules)
+        if key in self.orders:
+            self.hits += 1
+            self.orders.move_to_end(key)
+            return list(self.orders[key])
+        self.misses += 1
+        ordered_pages = reorder_pages(pages, self.rules)
+        if not _is_chained(ordered_pages, self.rules):
+            return ordered_pages
+        self.orders[key] = tuple(ordered_pages)
+        if len(self.orders) > self.maxsize:
+            self.orders.popitem(last=False)
+            self.evictions += 1
+        return ordered_pages
+
+    def middle_page(self, pages: list[int]) -> int:
+        '''Returns the middle page of the pages once reordered to satisfy all rules.'''
+        ordered_pages = self.reorder_pages(pages)
+        return ordered_pages[int((len(ordered_pages)-1)/2)]
+
+    def __repr__(self):
+        return f"ReorderCache(size={len(self.orders)}/{self.maxsize}, hits={self.hits}, misses={self.misses}, evictions={self.evictions})"
+
+def read_rules(lines) -> RuleIndex:
+    '''
+    Reads the rules section from an iterator of lines (such as an open file), up to the first empty line, and indexes the rules.
+    The iterator is left at the first update, so that the updates can be read from it one at a time.
+    '''
+    rules = []
+    for line in lines:
+        if len(line.strip()) == 0:
+            break
+        first, second = line.strip().split("|")
+        rules.append(Rule(int(first), int(second)))
+    return RuleIndex(rules)
+
+
+class LatencyHistogram:
+    '''
+    Histogram of latencies in logarithmic buckets, eight per doubling (so each bucket is about 9 % wide).
+    The memory use is constant regardless of the number of recorded latencies, and the percentiles are accurate to a bucket.
+    '''
+    BUCKETS_PER_DOUBLING = 8
+
+    def __init__(self) -> None:
+        self.counts = collections.Counter()
+        self.total  = 0
+        self.max    = 0
+
+    def add(self, nanoseconds: int) -> None:
+        self.counts[int(math.log2(max(nanoseconds, 1)) * self.BUCKETS_PER_DOUBLING)] += 1
+        self.total += 1
+        self.max = max(self.max, nanoseconds)
+
+    def percentile(self, percent: float) -> float:
+        '''Returns the upper bound of the bucket holding the given percentile, in nanoseconds.'''
+        if self.total == 0:
+            return 0.0
+        threshold = percent / 100 * self.total
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= threshold:
+                return min(2 ** ((bucket + 1) / self.BUCKETS_PER_DOUBLING), self.max)
+        return self.max
+
+    def __repr__(self):
+        return ", ".join([f"p{percent}={self.percentile(percent) / 1000:.1f} us" for percent in (50, 90, 99, 99.9)] + [f"max={self.max / 1000:.1f} us"])
+
+
+def serve_updates(rules: RuleIndex, lines, output, cache: ReorderCache = None) -> tuple:
+    '''
+    Validates updates as they arrive, one per line, with the rules indexed once beforehand.
+    For each update, writes a line with 'valid' or 'invalid' and the middle page of the (reordered) update to output.
+    Only running totals and a latency histogram are kept, so the memory use stays constant however many updates come through.
+    @param lines:   iterator of update lines, e.g. sys.stdin
+    @param output:  file-like object for the results, e.g. sys.stdout
+    @returns:       tuple (part 1 total, part 2 total, latency histogram)
+    '''
+    valid_sum, reordered_sum = 0, 0
+    latencies = LatencyHistogram()
+    for line in lines:
+        if len(line.strip()) == 0:
+            continue
+        start = time.perf_counter_ns()
+        pages = [int(page) for page in line.strip().split(',')]
+        if check_pages_against_all_rules(pages, rules):
+            middle = pages[int((len(pages)-1)/2)]
+            valid_sum += middle
+            result = f"valid {middle}"
+        else:
+            middle = cache.middle_page(pages) if cache is not None else middle_page(pages, rules)
+            reordered_sum += middle
+            result = f"invalid {middle}"
+        latencies.add(time.perf_counter_ns() - start)
+        output.write(result + "\n")
+        output.flush()
+    return valid_sum, reordered_sum, latencies
+
 # =========================
 
-def part1(rules: list, pages_list: list) -> int:
+def part1(rules: RuleIndex, pages_list: list) -> int:
     '''
     Solution for the part 1.
     '''
@@ -140,15 +342,14 @@ def part1(rules: list, pages_list: list) -> int:
     return ans
 
 
-def part2(rules: list, pages_list: list) -> int:
+def part2(rules: RuleIndex, pages_list: list, cache: ReorderCache = None) -> int:
     '''
-    Solution for the part 2.
+    Solution for the part 2. If a cache is given, the reordered updates are looked up from and stored in it.
     '''
     ans = 0
     for pages in pages_list:
         if not check_pages_against_all_rules(pages, rules):
-            reordered_pages = reorder_pages(pages, rules)
-            ans += reordered_pages[int((len(reordered_pages)-1)/2)]
+            ans += cache.middle_page(pages) if cache is not None else middle_page(pages, rules)
     return ans
 
 # =========================
@@ -157,12 +358,32 @@ if  __name__ == "__main__":
     # Fetch input text file path, either from the hard-coded variable FILENAME or from command line argument (if given)
     parser = argparse.ArgumentParser()
     parser.add_argument('input_fn', nargs='?', default=FILENAME, help="Path to the input text file. Optional; if not given, will default to the one hard-coded in the beginning of the script file.")
+    parser.add_argument('--cache-size', type=int, metavar='N', help="Cache the reordered updates of part 2 in an LRU cache holding N page sets, and report its statistics.")
+    parser.add_argument('--serve', action='store_true', help="Read only the rules from the input file, then validate updates read one per line from the standard input until it ends. With '-' as the input file, the rules are read from the standard input as well.")
     args =  parser.parse_args()
 
-    # Load and parse the data
-    data = load_file(args.input_fn)
-    rules, pages = parse_input(data)
+    if args.serve:
+        # Index the rules once, and serve the updates as they arrive
+        if args.input_fn == '-':
+            rules = read_rules(sys.stdin)
+        else:
+            with open(args.input_fn, 'r') as file:
+                rules = read_rules(file)
+        cache = ReorderCache(rules, args.cache_size) if args.cache_size is not None else None
+        valid_sum, reordered_sum, latencies = serve_updates(rules, sys.stdin, sys.stdout, cache)
+        print(f"Part 1 solution: {valid_sum}")
+        print(f"Part 2 solution: {reordered_sum}")
+        print(f"Latency per update: {latencies}", file=sys.stderr)
+        if cache is not None:
+            print(cache, file=sys.stderr)
+    else:
+        # Load and parse the data
+        data = load_file(args.input_fn)
+        rules, pages = parse_input(data)
+        cache = ReorderCache(rules, args.cache_size) if args.cache_size is not None else None
 
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(rules, pages)}")
-    print(f"Part 2 solution: {part2(rules, pages)}")
+        # Execute and print the solutions
+        print(f"Part 1 solution: {part1(rules, pages)}")
+        print(f"Part 2 solution: {part2(rules, pages, cache)}")
+        if cache is not None:
+            print(cache, file=sys.stderr)
@@ -25,9 +25,11 @@ The git repository for my solutions for AoC 2024 challenges can be found here: h
 
 import argparse
 import collections
+import concurrent.futures
 import itertools
 import logging
 import math
+import os
 
 LOGLEVEL = logging.WARNING
 logging.basicConfig(level=LOGLEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -50,60 +52,173 @@ def load_file(fn: str):
 
 # =========================
 
-def check_values(test_value, current_total, calibration_values, idx, concatenation_allowed=False) -> bool:
+def parse_row(row: str) -> tuple:
     '''
-    Recursively checks whether the test value can be achieved with any operations from the calibration values.
+    Parses one row of the input.
+    @param row:     one line of the input, e.g. "190: 10 19"
+    @returns:       tuple (test value, list of calibration values, list of magnitudes), where the magnitude of a
+                    calibration value is 10**(number of its digits), i.e. what the previous total is multiplied by when concatenating
+    '''
+    test_value, calibration_values = row.split(':')
+    calibration_values = [int(val) for val in calibration_values.split()]
+    magnitudes = [10 ** len(str(val)) for val in calibration_values]
+    return int(test_value), calibration_values, magnitudes
+
+
+def check_values(test_value, calibration_values, magnitudes, concatenation_allowed=False) -> bool:
+    '''
+    Checks whether the test value can be achieved with any operations from the calibration values, searching forwards
+    from the first calibration value. The search uses an explicit stack instead of recursion, so it works for rows of any length.
+    @param test_value:              The goal value
+    @param calibration_values:      The list of all calibration values to be used (non-negative)
+    @param magnitudes:              The magnitudes of the calibration values, as returned by parse_row
+    @param concatenation_allowed:   Whether to allow also concatenation operation (in part 2)
+    '''
+    nof_values = len(calibration_values)
+    # The total cannot decrease, unless it is multiplied by zero later on
+    can_prune = 0 not in calibration_values
+    # Each entry: the intermediate total thus far, and the index from calibration_values to be used next
+    stack = [(calibration_values[0], 1)]
+    while stack:
+        current_total, idx = stack.pop()
+        # Base case: all calibration values used
+        if idx >= nof_values:
+            if current_total == test_value:
+                return True
+            continue
+        # Stop early if test value exceeded, as exactly the total can no longer be achieved
+        if can_prune and current_total > test_value:
+            continue
+        value = calibration_values[idx]
+        # Push the operations in reverse order, so that addition is checked first
+        # Check concatenation (if allowed by the assignment)
+        if concatenation_allowed:
+            stack.append((current_total * magnitudes[idx] + value, idx + 1))
+        # Check multiplication
+        stack.append((current_total * value, idx + 1))
+        # Check addition
+        stack.append((current_total + value, idx + 1))
+    return False
+
+
+def check_values_reverse(test_value, calibration_values, magnitudes, concatenation_allowed=False) -> bool:
+    '''
+    Checks whether the test value can be achieved with any operations from the calibration values, searching backwards:
+    starting from the test value, the operations are undone one calibration value at a time, from the last one to the first.
+    An operation can only be undone if the result is possible: subtraction if the result is not negative, division if it is exact,
+    and removing the digits of the value (concatenation) if the target ends with them. Nearly all branches end immediately.
+    The search uses an explicit stack instead of recursion, so it works for rows of any length.
     @param test_value:              The goal value
-    @param current_total:           The intermediate total thus far
-    @param calibration_values:      The list of all calibration values to be used
-    @param idx:                     The index from calibration_values to be used next
+    @param calibration_values:      The list of all calibration values to be used (non-negative)
+    @param magnitudes:              The magnitudes of the calibration values, as returned by parse_row
     @param concatenation_allowed:   Whether to allow also concatenation operation (in part 2)
     '''
-    # Base case: all calibration values used
-    if idx >= len(calibration_values):
-        return current_total == test_value
-    # Stop early if test value exceeded. The total cannot decrease, meaning that exactly the total can no longer be achieved
-    if current_total > test_value:
-        return False
-    # Check addition
-    success = check_values(test_value, current_total + calibration_values[idx], calibration_values, idx+1, concatenation_allowed=concatenation_allowed)
-    # Check multiplication
-    if not success:
-        success = check_values(test_value, current_total * calibration_values[idx], calibration_values, idx+1, concatenation_allowed=concatenation_allowed)
-    # Check concatenation (if allowed by the assignment)
-    if not success and concatenation_allowed:
-        success = check_values(test_value, int(str(current_total)+str(calibration_values[idx])), calibration_values, idx+1, concatenation_allowed=concatenation_allowed)
-    return success
+    # Each entry: the value the first idx+1 calibration values need to produce
+    stack = [(test_value, len(calibration_values) - 1)]
+    while stack:
+        target, idx = stack.pop()
+        value = calibration_values[idx]
+        # Base case: only the first calibration value is left
+        if idx == 0:
+            if target == value:
+                return True
+            continue
+        # Undo addition
+        if target >= value:
+            stack.append((target - value, idx - 1))
+        # Undo multiplication. Multiplying by zero gives zero regardless of the previous values.
+        if value == 0:
+            if target == 0:
+                return True
+        elif target % value == 0:
+            stack.append((target // value, idx - 1))
+        # Undo concatenation (if allowed by the assignment)
+        if concatenation_allowed:
+            magnitude = magnitudes[idx]
+            if target >= value and (target - value) % magnitude == 0:
+                stack.append(((target - value) // magnitude, idx - 1))
+    return False
 
+# =========================
 
+def solve_equations(rows, reverse: bool = True) -> tuple:
+    '''
+    Solves both parts for the given parsed rows at once. Each row is first checked without concatenation;
+    a row that passes counts for both parts, so only the rows that fail are searched again with concatenation.
+    @param rows:        iterable of parsed rows, as returned by parse_row
+    @param reverse:     whether to use check_values_reverse (True) or check_values (False)
+    @returns:           tuple (part 1 solution, part 2 solution)
+    '''
+    solver = check_values_reverse if reverse else check_values
+    total, total_with_concatenation = 0, 0
+    for test_value, calibration_values, magnitudes in rows:
+        if solver(test_value, calibration_values, magnitudes, concatenation_allowed=False):
+            total += test_value
+            total_with_concatenation += test_value
+        elif solver(test_value, calibration_values, magnitudes, concatenation_allowed=True):
+            total_with_concatenation += test_value
+    return total, total_with_concatenation
+
+def _solve_equations_in_range(fn: str, start: int, end: int, reverse: bool) -> tuple:
+    '''Worker for solve_equations_parallel: parses and solves the rows in the given byte range of the file.'''
+    with open(fn, 'rb') as file:
+        file.seek(start)
+        lines = file.read(end - start).decode().splitlines()
+    return solve_equations((parse_row(line) for line in lines if len(line.strip()) > 0), reverse)
+
+def solve_equations_parallel(fn: str, workers=None, chunk_size=1 << 20, reverse: bool = True) -> tuple:
+    '''
+    Solves both parts for a (large) input file, processing it in chunks on a process pool.
+    The file is split into chunks of about chunk_size bytes, each ending at a line break, so that no row is split.
+    Each worker parses its own chunk, so the rows are parsed only once and never sent between processes.
+    @param fn:          path to the input file
+    @param workers:     number of worker processes; defaults to the number of CPUs
+    @param chunk_size:  approximate size of one chunk in bytes
+    @param reverse:     whether to use check_values_reverse (True) or check_values (False)
+    @returns:           tuple (part 1 solution, part 2 solution)
+    '''
+    file_size = os.path.getsize(fn)
+    bounds = [0]
+    with open(fn, 'rb') as file:
+        while bounds[-1] < file_size:
+            file.seek(min(bounds[-1] + chunk_size, file_size))
+            # Extend the chunk to the end of the line it ends on
+            file.readline()
+            bounds.append(min(file.tell(), file_size))
+    logging.debug(f"Split the input into {len(bounds)-1} chunks")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_solve_equations_in_range, itertools.repeat(fn), bounds[:-1], bounds[1:], itertools.repeat(reverse))
+        total, total_with_concatenation = 0, 0
+        for chunk_total, chunk_total_with_concatenation in results:
+            total += chunk_total
+            total_with_concatenation += chunk_total_with_concatenation
+    return total, total_with_concatenation
 
 # =========================
 
-def part1(data: list) -> int:
+def part1(data: list, reverse: bool = True) -> int:
     '''
-    Solution for the part 1.
+    Solution for the part 1. The rows are checked with check_values_reverse, or with check_values if reverse is False.
     '''
+    solver = check_values_reverse if reverse else check_values
     ans = 0
     for row in data:
-        test_value, calibration_values = row.split(':')
-        test_value = int(test_value)
-        calibration_values = [int(val.strip()) for val in calibration_values.split(" ") if len(val) > 0]
-        success = check_values(test_value, calibration_values[0], calibration_values, 1, concatenation_allowed=False)
+        test_value, calibration_values, magnitudes = parse_row(row)
+        success = solver(test_value, calibration_values, magnitudes, concatenation_allowed=False)
         if success:
             ans += test_value
     return ans
 
 
-def part2(data: list) -> int:
+def part2(data: list, reverse: bool = True) -> int:
     '''
-    Solution for the part 2.
+    Solution for the part 2. The rows are checked with check_values_reverse, or with check_values if reverse is False.
     '''
+    solver = check_values_reverse if reverse else check_values
     ans = 0
     for row in data:
-        test_value, calibration_values = row.split(':')
-        test_value = int(test_value)
-        calibration_values = [int(val.strip()) for val in calibration_values.split(" ") if len(val) > 0]
-        success = check_values(test_value, calibration_values[0], calibration_values, 1, concatenation_allowed=True)
+        test_value, calibration_values, magnitudes = parse_row(row)
+        success = solver(test_value, calibration_values, magnitudes, concatenation_allowed=True)
         if success:
             ans += test_value
     return ans
@@ -114,11 +229,18 @@ if  __name__ == "__main__":
     # Fetch input text file path, either from the hard-coded variable FILENAME or from command line argument (if given)
     parser = argparse.ArgumentParser()
     parser.add_argument('input_fn', nargs='?', default=FILENAME, help="Path to the input text file. Optional; if not given, will default to the one hard-coded in the beginning of the script file.")
+    parser.add_argument('--forward', action='store_true', help="Search forwards from the first calibration value instead of backwards from the test value.")
+    parser.add_argument('--workers', type=int, metavar='N', help="Parse and solve the input in chunks on N worker processes. Meant for very large inputs.")
     args =  parser.parse_args()
 
-    # Load the data
-    data = load_file(args.input_fn)
-
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(data)}")
-    print(f"Part 2 solution: {part2(data)}")
+    if args.workers is not None:
+        # Solve both parts in one go on a process pool
+        total, total_with_concatenation = solve_equations_parallel(args.input_fn, args.workers, reverse=not args.forward)
+    else:
+        # Load the data
+        data = load_file(args.input_fn)
+
+        # Solve both parts in one go, parsing each row as it is needed
+        total, total_with_concatenation = solve_equations(map(parse_row, data), reverse=not args.forward)
+    print(f"Part 1 solution: {total}")
+    print(f"Part 2 solution: {total_with_concatenation}")
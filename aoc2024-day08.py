@@ -24,8 +24,13 @@ The git repository for my solutions for AoC 2024 challenges can be found here: h
 '''
 
 import argparse
-import itertools
+import collections
 import logging
+import math
+import random
+import re
+import sys
+import time
 
 LOGLEVEL = logging.WARNING
 logging.basicConfig(level=LOGLEVEL, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -48,24 +53,32 @@ def load_file(fn: str):
 
 # =========================
 
-def find_antennas(data):
-    '''Function finds all antennas from the list and returns them in a dict.'''
+# Any character except for an empty cell or whitespace is an antenna
+ANTENNA_PATTERN = re.compile(r"[^.\s]")
+
+def find_antennas(data) -> dict:
+    '''
+    Function finds all antennas from the map and returns them in a dict, holding a list of positions for each frequency.
+    A position is the coordinates packed into a single integer, row*width + col, which is also its index in an antinode bitmap.
+    '''
+    width = len(data[0])
     antennas = {}
-    # Find antennas from the lis
+    # Find antennas from the list; the regex skips the empty cells ('.') without looping over them in Python
     for row_idx, row in enumerate(data):
-        for col_idx, char in enumerate(row):
-            if len(char.strip()) == 0:
-                continue
-            if char == '.':
-                continue
+        for match in ANTENNA_PATTERN.finditer(row):
+            char = match[0]
             if char not in antennas:
                 antennas[char] = []
-            antennas[char].append([row_idx, col_idx])
+            antennas[char].append(row_idx * width + match.start())
     return antennas
 
 
-def find_antinote_locations(coord1, coord2):
-    '''Function finds and returns both antinode locations between two antennas' coordinates for part 1.'''
+def find_antinote_locations(coord, other_coords, height, width):
+    '''
+    Function finds and returns the positions (row*width + col) of the antinodes for part 1 which lie beyond the antenna at coord,
+    as seen from each of the other antennas (of the same frequency), and which are inside the map.
+    Each pair of antennas has one such antinode beyond each of the two, so calling this once for every antenna covers all pairs.
+    '''
     # The following equations are the result of simple linear algebra done on paper, trust me bro
     # A=antenna1, B=antenna2, N=antinode, [QW]=vector from Q to W, x_s = x-component of s, y_s = y-component of s
     # For the one closer to A:
@@ -74,24 +87,211 @@ def find_antinote_locations(coord1, coord2):
     #   ->  x_n = 2*x_a - x_b ;             y_n = 2*y_a -y_b
     # And similarly to the one closer to B:
     #       x_n = 2*x_b - x_a ;             y_n = 2*y_b -y_a
-    return [[2*coord1[0]-coord2[0], 2*coord1[1]-coord2[1]], [2*coord2[0]-coord1[0], 2*coord2[1]-coord1[1]]]
+    double_row, double_col = 2*coord[0], 2*coord[1]
+    # The bounds are checked before packing, as a column outside the map would wrap around to another row
+    return [row * width + col for row_b, col_b in other_coords
+            if 0 <= (row := double_row - row_b) < height and 0 <= (col := double_col - col_b) < width]
+
+def canonical_lines(coord, later_coords) -> list:
+    '''
+    Function returns the keys identifying the lines through the antenna at coord and each of the antennas at later_coords,
+    which must come after coord in reading order (as given by find_antennas). The key of a line is the same for any two points on it.
+    The key is (delta_row, delta_col, offset): the direction reduced by the gcd of its components, which points downwards
+    (or to the right, on a horizontal line) as the other point comes later, and offset = delta_col*row - delta_row*col,
+    which is constant along the line.
+    '''
+    row, col = coord
+    return [(delta_row, delta_col, delta_col * row - delta_row * col) for row_b, col_b in later_coords
+            for divisor in (math.gcd(row_b - row, col_b - col),)
+            for delta_row, delta_col in (((row_b - row) // divisor, (col_b - col) // divisor),)]
+
+def find_antinote_harmonics(coord, delta_row, delta_col, height, width) -> range:
+    '''
+    Function finds and returns the positions (row*width + col) of all antinodes for part 2 on the line through coord in the
+    direction (delta_row, delta_col), as given by canonical_lines. These are all the grid points of the line inside the map.
+    '''
+    row, col = coord
+    # The points of the line are (row + k*delta_row, col + k*delta_col); find the range of k for which both are inside the map.
+    # The direction points downwards or to the right, so delta_row is never negative.
+    first_k, last_k = -height * width, height * width
+    if delta_row > 0:
+        first_k, last_k = -(row // delta_row), (height - 1 - row) // delta_row
+    if delta_col > 0:
+        first_k, last_k = max(first_k, -(col // delta_col)), min(last_k, (width - 1 - col) // delta_col)
+    elif delta_col < 0:
+        first_k, last_k = max(first_k, -((width - 1 - col) // -delta_col)), min(last_k, col // -delta_col)
+    # The step between packed positions is positive as well
+    step = delta_row * width + delta_col
+    start = (row + first_k * delta_row) * width + col + first_k * delta_col
+    return range(start, start + (last_k - first_k + 1) * step, step)
+
+
+# =========================
+
+class AntennaMap:
+    '''
+    Incrementally maintained map of antennas. Supports adding and removing antennas one at a time, and reports the number of
+    distinct antinode cells for both parts without recomputing every pair.
+
+    Each part 1 antinode cell keeps a reference count of the antenna pairs producing it. For part 2, each line through a pair of
+    antennas (keyed as in canonical_lines) keeps a count of the pairs on it, and each cell a count of the distinct lines through it.
+    Adding or removing an antenna only touches its pairs with the other antennas of the same frequency, so it costs
+    O(antennas of that frequency), plus the length of each line that appears or disappears.
+    The counts are kept in dicts, so that memory use depends on the number of antinodes instead of the map size.
+    '''
+    def __init__(self, height: int, width: int) -> None:
+        self.height     = height
+        self.width      = width
+        self.antennas   = collections.defaultdict(set)  # Frequency -> set of positions (row*width + col)
+        self.occupied   = {}                            # Position -> frequency of the antenna there
+        self.antinodes  = collections.Counter()         # Part 1 antinode position -> number of pairs
+        self.lines      = collections.Counter()         # Line key -> number of pairs on the line
+        self.harmonics  = collections.Counter()         # Part 2 antinode position -> number of distinct lines
+
+    @classmethod
+    def from_input(cls, data: list):
+        '''Builds the structure from the lines of the input file.'''
+        antenna_map = cls(len(data), len(data[0]))
+        for freq, positions in find_antennas(data).items():
+            for position in positions:
+                antenna_map.add(freq, *divmod(position, antenna_map.width))
+        return antenna_map
+
+    def _update(self, freq: str, position: int, change: int) -> None:
+        '''Adds change (+1 or -1) to the counts of every pair between the antenna at position and the other antennas of the frequency.'''
+        coord = divmod(position, self.width)
+        earlier, later = [], []
+        for other in self.antennas[freq]:
+            if other != position:
+                (earlier if other < position else later).append(divmod(other, self.width))
+
+        # Part 1: the antinodes beyond this antenna, and the ones beyond each of the other antennas as seen from this one
+        cells = find_antinote_locations(coord, earlier + later, self.height, self.width)
+        for other_coord in earlier + later:
+            cells.extend(find_antinote_locations(other_coord, (coord,), self.height, self.width))
+        for cell in cells:
+            self.antinodes[cell] += change
+            if self.antinodes[cell] == 0:
+                del self.antinodes[cell]
+
+        # Part 2: the lines to the earlier antennas point the other way, so their keys are negated to the canonical form
+        keys = canonical_lines(coord, later) + [(-delta_row, -delta_col, -offset) for delta_row, delta_col, offset in canonical_lines(coord, earlier)]
+        for key in keys:
+            self.lines[key] += change
+            # Only a line which appears or disappears changes the cells
+            if self.lines[key] == (1 if change > 0 else 0):
+                for cell in find_antinote_harmonics(coord, key[0], key[1], self.height, self.width):
+                    self.harmonics[cell] += change
+                    if self.harmonics[cell] == 0:
+                        del self.harmonics[cell]
+            if self.lines[key] == 0:
+                del self.lines[key]
+
+    def _position(self, row: int, col: int) -> int:
+        '''Returns the packed position of a cell, checking that it is inside the map (a column outside would alias another row).'''
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            raise ValueError(f"Cell {row},{col} is outside the map")
+        return row * self.width + col
+
+    def add(self, freq: str, row: int, col: int) -> None:
+        '''Adds an antenna of the given frequency (a single ASCII character other than '.' or whitespace) to an empty cell.'''
+        if len(freq) != 1 or not freq.isascii() or not ANTENNA_PATTERN.fullmatch(freq):
+            raise ValueError(f"Invalid frequency {freq!r}: must be a single ASCII character other than '.' or whitespace")
+        position = self._position(row, col)
+        if position in self.occupied:
+            raise ValueError(f"Cell {row},{col} already has an antenna")
+        self.occupied[position] = freq
+        self.antennas[freq].add(position)
+        self._update(freq, position, 1)
+
+    def remove(self, row: int, col: int) -> None:
+        '''Removes the antenna from the given cell.'''
+        position = self._position(row, col)
+        if position not in self.occupied:
+            raise ValueError(f"Cell {row},{col} has no antenna")
+        freq = self.occupied.pop(position)
+        self._update(freq, position, -1)
+        self.antennas[freq].discard(position)
+
+    def to_map(self) -> list:
+        '''Returns the map as a list of lines, as in the input file.'''
+        cells = bytearray(b"." * (self.height * self.width))
+        for position, freq in self.occupied.items():
+            cells[position] = ord(freq)
+        return [cells[start:start + self.width].decode() for start in range(0, len(cells), self.width)]
+
+    def count_antinodes(self) -> int:
+        '''Returns the number of distinct antinode cells (part 1).'''
+        return len(self.antinodes)
 
-def find_antinote_harmonics(coord1, coord2, max_row, max_col):
-    '''Function finds and returns all antinode locations between two antennas' coordinates for part 2.'''
-    def antinodes_to_direction(row, col, max_row, max_col, delta_row, delta_col):
-        '''Finds all antinodes from starting row and col up until max_row and max_col, when each antinode happens every delta_row rows and delta_col cols.'''
-        coordinates = []
-        while 0 <= row <= max_row and 0 <= col <= max_col:
-            coordinates.append([row,col])
-            row += delta_row
-            col += delta_col
-        return coordinates
+    def count_harmonics(self) -> int:
+        '''Returns the number of distinct antinode cells with the resonant harmonics (part 2).'''
+        return len(self.harmonics)
+
+
+def random_edits(antenna_map: AntennaMap, nof_edits: int, seed=0) -> list:
+    '''
+    Generates a stream of random edits for the map, without applying them: each edit either removes an existing antenna,
+    as ('remove', row, col), or puts an antenna of one of the map's frequencies on an empty cell, as ('add', freq, row, col).
+    '''
+    rng = random.Random(seed)
+    nof_cells = antenna_map.height * antenna_map.width
+    frequencies = sorted(antenna_map.antennas) or ["A"]
+    # Occupied cells, as a list for picking a random one and a dict from a cell to its index in the list
+    occupied = list(antenna_map.occupied)
+    occupied_idx = {position: idx for idx, position in enumerate(occupied)}
+    edits = []
+    while len(edits) < nof_edits:
+        if occupied and (rng.random() < 0.5 or len(occupied) == nof_cells):
+            position = occupied[rng.randrange(len(occupied))]
+            # Fill the hole with the last cell of the list
+            last = occupied.pop()
+            if last != position:
+                occupied[occupied_idx[position]] = last
+                occupied_idx[last] = occupied_idx[position]
+            del occupied_idx[position]
+            edits.append(('remove', *divmod(position, antenna_map.width)))
+        else:
+            position = rng.randrange(nof_cells)
+            if position in occupied_idx:
+                continue
+            occupied_idx[position] = len(occupied)
+            occupied.append(position)
+            edits.append(('add', rng.choice(frequencies), *divmod(position, antenna_map.width)))
+    return edits
+
+
+def replay_benchmark(data: list, nof_edits: int, seed=0):
+    '''
+    Benchmarks AntennaMap on a stream of random antenna additions and removals (see random_edits), reading both antinode counts
+    after every edit. The timings are printed to stderr, together with the time of solving the final map from scratch with
+    part1 and part2. Returns the final counts, which are checked against those solutions.
+    '''
+    build_start = time.perf_counter()
+    antenna_map = AntennaMap.from_input(data)
+    print(f"AntennaMap: {len(antenna_map.occupied)} antennas on a {antenna_map.height}x{antenna_map.width} map, "
+          f"built in {time.perf_counter() - build_start:.3f} s", file=sys.stderr)
 
-    # Distances between two antinodes in y- and x-coordinates
-    delta_row, delta_col = coord2[0]-coord1[0], coord2[1]-coord1[1]
+    edits = random_edits(antenna_map, nof_edits, seed)
+    replay_start = time.perf_counter()
+    for action, *args in edits:
+        if action == 'add':
+            antenna_map.add(*args)
+        else:
+            antenna_map.remove(*args)
+        # Both counts are read after every edit, as a user of the structure would
+        antenna_map.count_antinodes(), antenna_map.count_harmonics()
+    replay_time = time.perf_counter() - replay_start
+    counts = (antenna_map.count_antinodes(), antenna_map.count_harmonics())
+    print(f"AntennaMap: {nof_edits} edits in {replay_time:.3f} s, {1e3 * replay_time / max(nof_edits, 1):.2f} ms each", file=sys.stderr)
 
-    # Final antinodes: start from each of the two antennas and proceed until out of bounds
-    return antinodes_to_direction(coord2[0], coord2[1], max_row, max_col, delta_row, delta_col) + antinodes_to_direction(coord1[0], coord1[1], max_row, max_col, -delta_row, -delta_col)
+    final_map = antenna_map.to_map()
+    solve_start = time.perf_counter()
+    expected = (part1(final_map), part2(final_map))
+    print(f"Solving the final map from scratch: {time.perf_counter() - solve_start:.3f} s", file=sys.stderr)
+    if counts != expected:
+        raise RuntimeError(f"Incremental counts {counts} differ from the solutions of the final map {expected}")
+    return counts
 
 
 # =========================
@@ -100,33 +300,39 @@ def part1(data: list) -> int:
     '''
     Solution for the part 1.
     '''
-    antennas = find_antennas(data)
-    antinodes = {}
-    for freq, coords in antennas.items():
-        # Loop over every pair of coordinates of the same kind of antenna
-        for coord1, coord2 in itertools.combinations(coords,r=2):
-            antinode_coordinates = find_antinote_locations(coord1, coord2)
-            # Loop through each antinode location and mark it as such, if inside map bounds
-            for (row, col) in antinode_coordinates:
-                if 0 <= row < len(data) and 0 <= col < len(data[0]):
-                    antinodes[f"{row},{col}"] = True
-    return len(antinodes)
+    height, width = len(data), len(data[0])
+    # One byte per map cell, set to 1 for antinodes
+    antinodes = bytearray(height * width)
+    for freq, positions in find_antennas(data).items():
+        coords = [divmod(position, width) for position in positions]
+        # Loop over every antenna, and mark the antinodes beyond it as seen from the other antennas of the same kind
+        for idx, coord in enumerate(coords):
+            for position in find_antinote_locations(coord, coords[:idx] + coords[idx+1:], height, width):
+                antinodes[position] = 1
+    return antinodes.count(1)
 
 
 def part2(data: list) -> int:
     '''
     Solution for the part 2.
     '''
-    antennas = find_antennas(data)
-    antinodes = {}
-    for freq, coords in antennas.items():
-        # Loop over every pair of coordinates of the same kind of antenna
-        for coord1, coord2 in itertools.combinations(coords,r=2):
-            antinode_coordinates = find_antinote_harmonics(coord1, coord2, len(data)-1, len(data[0])-1)
-            # Loop through each antinode location and mark it as such (already checked if inside map bounds in find_antinode_harmonics)
-            for (row, col) in antinode_coordinates:
-                antinodes[f"{row},{col}"] = True
-    return len(antinodes)
+    height, width = len(data), len(data[0])
+    # Collect the distinct lines through pairs of antennas of the same kind, with one antenna on each line.
+    # Any number of antennas of a frequency on the same line only give that line once.
+    lines = {}
+    for freq, positions in find_antennas(data).items():
+        coords = [divmod(position, width) for position in positions]
+        for idx, coord in enumerate(coords):
+            # Any point of the line will do, so the antenna can be stored even if the line is already known
+            lines.update(dict.fromkeys(canonical_lines(coord, coords[idx+1:]), coord))
+    logging.debug(f"No of distinct antinode lines: {len(lines)}")
+    # One byte per map cell, set to 1 for antinodes. Each line is written at once as an extended slice.
+    antinodes = bytearray(height * width)
+    ones = memoryview(b"\x01" * max(height, width))
+    for (delta_row, delta_col, _), coord in lines.items():
+        cells = find_antinote_harmonics(coord, delta_row, delta_col, height, width)
+        antinodes[cells.start:cells.stop:cells.step] = ones[:len(cells)]
+    return antinodes.count(1)
 
 # =========================
 
@@ -134,11 +340,18 @@ if  __name__ == "__main__":
     # Fetch input text file path, either from the hard-coded variable FILENAME or from command line argument (if given)
     parser = argparse.ArgumentParser()
     parser.add_argument('input_fn', nargs='?', default=FILENAME, help="Path to the input text file. Optional; if not given, will default to the one hard-coded in the beginning of the script file.")
+    parser.add_argument('--replay', type=int, metavar='N', help="Benchmark the incremental AntennaMap structure by replaying N random antenna additions and removals on the input.")
     args =  parser.parse_args()
 
     # Load the data
     data = load_file(args.input_fn)
 
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(data)}")
-    print(f"Part 2 solution: {part2(data)}")
+    if args.replay is not None:
+        # Replay random edits, and print the solutions for the final map
+        antinodes, harmonics = replay_benchmark(data, args.replay)
+        print(f"Part 1 solution: {antinodes}")
+        print(f"Part 2 solution: {harmonics}")
+    else:
+        # Execute and print the solutions
+        print(f"Part 1 solution: {part1(data)}")
+        print(f"Part 2 solution: {part2(data)}")
@@ -56,37 +56,44 @@ DIRECTIONS = [
 ]
 
 
-def trails_from(map, row_start, col_start) -> list:
+def score_trails(map) -> tuple:
     '''
-    Function determines all trails starting from the starting coordinates and returns the peaks in a list, as strings in format "peak_row,peak_col".
-    Any peak can exist in the list multiple times if there are multiple distinct trails leading to said peak.
+    Function determines the total score and the total rating of all trailheads on the map in a single pass.
+    The cells are processed in layers from height 9 down to 0. For each cell, the set of peaks reachable from it is kept as a bitset
+    (a Python int with one bit per peak), and the number of distinct trails from it to any peak as an integer. A cell of height h
+    gets the union of the bitsets and the sum of the trail counts of its neighbours of height h+1, so every cell is visited once.
+    @returns:   tuple (sum of the scores, sum of the ratings), i.e. (part 1 solution, part 2 solution)
     '''
-    def _traverse_recursively(map, row, col, previous_val, peaks):
-        '''Traverses the map recursively, trying to find a trail towards the peaks.'''
-        # Not a valid trail if coordinates are out of the map
-        if not 0 <= row < len(map) or not 0  <= col < len(map[0]):
-            return
-        current_val = map[row][col]
-        # Not a valid trail if the current height is not exactly one more than the previous height
-        if current_val != previous_val + 1:
-            return
-        # If reached a 9, this is a valid trail
-        if current_val == 9:
-            peaks.append(f"{row},{col}")
-            return
-        # Loop through each direction and continue the trails
-        for direction in DIRECTIONS:
-            _traverse_recursively(map, row+direction[0], col+direction[1], current_val, peaks)
-    # Determine height of the starting coordinates and return empty list, if the height is not 0
-    val = map[row_start][col_start]
-    if val != 0:
-        return []
-    
-    # Collect all trail peaks starting from the starting coordinates into the list peaks and return it
-    peaks = list()
-    _traverse_recursively(map, row_start, col_start, -1, peaks)
-    return peaks
-    
+    height, width = len(map), len(map[0])
+    # Cells of each height, as packed positions row*width + col
+    layers = [[] for _ in range(10)]
+    for row, col in itertools.product(range(height), range(width)):
+        layers[map[row][col]].append(row * width + col)
+
+    reachable_peaks = [0] * (height * width)
+    nof_trails = [0] * (height * width)
+    # Each peak gets its own bit, and has one trail (to itself)
+    for peak_idx, position in enumerate(layers[9]):
+        reachable_peaks[position] = 1 << peak_idx
+        nof_trails[position] = 1
+    for current_height in range(8, -1, -1):
+        for position in layers[current_height]:
+            row, col = divmod(position, width)
+            peaks, trails = 0, 0
+            for delta_row, delta_col in DIRECTIONS:
+                # Only the neighbours of the next height continue a trail; any other cell has no peaks and no trails stored yet
+                if 0 <= row + delta_row < height and 0 <= col + delta_col < width and map[row + delta_row][col + delta_col] == current_height + 1:
+                    neighbour = position + delta_row * width + delta_col
+                    peaks |= reachable_peaks[neighbour]
+                    trails += nof_trails[neighbour]
+            reachable_peaks[position] = peaks
+            nof_trails[position] = trails
+
+    # The score of a trailhead is the number of peaks reachable from it, and the rating the number of trails
+    score = sum(reachable_peaks[position].bit_count() for position in layers[0])
+    rating = sum(nof_trails[position] for position in layers[0])
+    return score, rating
+
 
 # =========================
 
@@ -94,24 +101,16 @@ def part1(data: list) -> int:
     '''
     Solution for the part 1.
     '''
-    ans = 0
-    for row, col in itertools.product(range(len(data)), range(len(data[0]))):
-        peaks = trails_from(data, row, col)
-        # Count each peak only once
-        ans += len(set(peaks))
-    return ans
+    # Count each peak only once for each trailhead
+    return score_trails(data)[0]
 
 
 def part2(data: list) -> int:
     '''
     Solution for the part 2.
     '''
-    ans = 0
-    for row, col in itertools.product(range(len(data)), range(len(data[0]))):
-        peaks = trails_from(data, row, col)
-        # Count each peak as many times as there are distinct trails to it
-        ans += len(peaks)
-    return ans
+    # Count each peak as many times as there are distinct trails to it
+    return score_trails(data)[1]
 
 # =========================
 
@@ -124,6 +123,7 @@ if  __name__ == "__main__":
     # Load the data
     data = load_file(args.input_fn)
 
-    # Execute and print the solutions
-    print(f"Part 1 solution: {part1(data)}")
-    print(f"Part 2 solution: {part2(data)}")
+    # Execute both parts in a single pass, and print the solutions
+    score, rating = score_trails(data)
+    print(f"Part 1 solution: {score}")
+    print(f"Part 2 solution: {rating}")